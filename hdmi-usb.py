@@ -19,14 +19,24 @@ Key Features:
 """
 import gi
 import argparse
+import ctypes
+import logging
 import signal
+import stat
 import os
 import re
+import select
+import shutil
 import subprocess
 import atexit
+import functools
+import errno
+import fcntl
+import struct
 import sys
 import time
-from datetime import datetime
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
@@ -34,6 +44,36 @@ gi.require_version('Gst', '1.0')
 gi.require_version('GstRtspServer', '1.0')
 from gi.repository import Gst, GstRtspServer, GLib, GObject
 
+# Optional: GTK (X11 backend) + GstVideo let the local preview render into a
+# window we own, so saved geometry is applied before the window is mapped
+# instead of chasing the sink-created window with wmctrl/xwininfo.
+# Loaded by _load_gtk() only when the preview window is created, so headless
+# runs never initialise GTK. HAVE_GTK is None until then.
+HAVE_GTK = None
+Gtk = Gdk = GdkX11 = GstVideo = None
+
+
+def _load_gtk() -> bool:
+    """Import GTK/Gdk/GdkX11/GstVideo on first use; return HAVE_GTK."""
+    global HAVE_GTK, Gtk, Gdk, GdkX11, GstVideo
+    if HAVE_GTK is None:
+        try:
+            gi.require_version('Gtk', '3.0')
+            gi.require_version('Gdk', '3.0')
+            gi.require_version('GdkX11', '3.0')
+            gi.require_version('GstVideo', '1.0')
+            from gi.repository import Gdk as _Gdk
+            # Pin GDK to X11 (the sink needs an XID) without exporting
+            # GDK_BACKEND to every child process; must precede GTK init,
+            # which happens when Gtk is imported.
+            _Gdk.set_allowed_backends('x11')
+            from gi.repository import Gtk as _Gtk, GdkX11 as _GdkX11, GstVideo as _GstVideo
+            Gtk, Gdk, GdkX11, GstVideo = _Gtk, _Gdk, _GdkX11, _GstVideo
+            HAVE_GTK = True
+        except (ValueError, ImportError):
+            HAVE_GTK = False
+    return HAVE_GTK
+
 # Configuration constants
 DEFAULT_RTSP_PORT = "1234"
 DEFAULT_RTSP_ENDPOINT = "/hdmi"
@@ -43,6 +83,108 @@ AUDIO_SAMPLE_RATE_HZ = 48000
 AUDIO_BITRATE_BPS = 128000
 VIDEO_BITRATE_KBPS = 3000
 VIDEO_KEYFRAME_INTERVAL_FRAMES = 30
+LOCAL_WINDOW_DEFAULT_WIDTH = 1280
+WINDOW_STATE_SAVE_DELAY_MS = 500
+# SCHED_RR priority used with --realtime, and the elements whose streaming
+# threads get it (capture and the decode work that follows on that thread).
+REALTIME_PRIORITY = 10
+REALTIME_ELEMENTS = ("v4l2src", "alsasrc")
+# Written on a clean exit; a fresh one lets the next run skip the device reset.
+CLEAN_EXIT_MARKER_FILE = Path.home() / '.hdmi-rtsp-unified-clean-exit'
+CLEAN_EXIT_MAX_AGE_SECONDS = 60
+
+# ANSI colours for status banners.
+_GREEN = "\033[92m"
+_RESET = "\033[0m"
+
+# Hardware H.264 encoders, in order of preference. x264enc (software) is the
+# fallback when none of these can be used.
+HW_H264_ENCODERS = ("vaapih264enc", "nvh264enc", "v4l2h264enc")
+# Hardware MJPEG decoders, in order of preference (fallback: jpegdec).
+HW_JPEG_DECODERS = ("vaapijpegdec", "vajpegdec", "v4l2jpegdec")
+# Preferred AAC encoders (fallback: voaacenc).
+AAC_ENCODERS = ("fdkaacenc",)
+
+# Pipeline errors matching this are reported to the server as fatal.
+_CRITICAL_ERROR_RE = re.compile(r"resource busy|failed to|cannot", re.IGNORECASE)
+# `v4l2-ctl --all` output: an HDMI resolution (e.g. "1920x1080", "1280/720")
+# and the lines worth showing when none is found.
+_HDMI_RESOLUTION_RE = re.compile(r"1920[^\n]{0,4}1080|1280[^\n]{0,4}720")
+_FORMAT_LINE_RE = re.compile(r"Size:|Width/Height|fmt", re.IGNORECASE)
+# USB device path component in sysfs, e.g. "1-1.2" in ".../1-1.2:1.0".
+_USB_TAIL_RE = re.compile(r"\d+-[\d.]+")
+# Card line in /proc/asound/cards, e.g. " 1 [MS2109         ]: USB-Audio - ...".
+_ALSA_CARD_LINE_RE = re.compile(r"^\s*(\d+)\s+\[(\S+)", re.MULTILINE)
+# X11 geometry string as saved in the window state file: WIDTHxHEIGHT+X+Y
+# (offsets may be negative).
+_GEOMETRY_RE = re.compile(r"^(\d+)x(\d+)([+-]\d+)([+-]\d+)$")
+# Video node path in `v4l2-ctl --list-devices` output.
+_DEV_VIDEO_RE = re.compile(r"/dev/video\d+")
+# Command line of a gst-launch pipeline capturing from a V4L2 device.
+_GST_LAUNCH_V4L2_RE = re.compile(r"gst-launch-1.0.*v4l2src")
+
+
+# V4L2 ioctls (linux/videodev2.h), used to query devices without v4l2-ctl.
+def _IOC(direction: int, ioc_type: str, nr: int, size: int) -> int:
+    return (direction << 30) | (size << 16) | (ord(ioc_type) << 8) | nr
+
+
+def _IOW(ioc_type: str, nr: int, size: int) -> int:
+    return _IOC(1, ioc_type, nr, size)
+
+
+def _IOR(ioc_type: str, nr: int, size: int) -> int:
+    return _IOC(2, ioc_type, nr, size)
+
+
+def _IOWR(ioc_type: str, nr: int, size: int) -> int:
+    return _IOC(3, ioc_type, nr, size)
+
+
+V4L2_BUF_TYPE_VIDEO_CAPTURE = 1
+V4L2_CAP_VIDEO_CAPTURE = 0x00000001
+V4L2_CAP_DEVICE_CAPS = 0x80000000
+V4L2_FRMSIZE_TYPE_DISCRETE = 1
+V4L2_MEMORY_MMAP = 1
+# struct v4l2_capability: driver[16], card[32], bus_info[32], version,
+# capabilities, device_caps, reserved[3]
+_V4L2_CAPABILITY = struct.Struct("<16s32s32sIII3I")
+VIDIOC_QUERYCAP = _IOR('V', 0, _V4L2_CAPABILITY.size)
+# struct v4l2_fmtdesc: index, type, flags, description[32], pixelformat,
+# mbus_code, reserved[3]
+_V4L2_FMTDESC = struct.Struct("<III32sII3I")
+VIDIOC_ENUM_FMT = _IOWR('V', 2, _V4L2_FMTDESC.size)
+# struct v4l2_frmsizeenum: index, pixel_format, type, union (discrete
+# width/height or stepwise min/max/step), reserved[2]
+_V4L2_FRMSIZEENUM = struct.Struct("<III6I2I")
+VIDIOC_ENUM_FRAMESIZES = _IOWR('V', 74, _V4L2_FRMSIZEENUM.size)
+# struct v4l2_requestbuffers: count, type, memory, then capabilities/flags/
+# reserved (left zero)
+_V4L2_REQUESTBUFFERS = struct.Struct("<III8x")
+VIDIOC_REQBUFS = _IOWR('V', 8, _V4L2_REQUESTBUFFERS.size)
+_V4L2_BUF_TYPE = struct.Struct("<i")
+VIDIOC_STREAMON = _IOW('V', 18, _V4L2_BUF_TYPE.size)
+VIDIOC_STREAMOFF = _IOW('V', 19, _V4L2_BUF_TYPE.size)
+# sysfs/V4L2 card name of the MacroSilicon USB HDMI capture adapter.
+HDMI_USB_DEVICE_NAME = "USB Video: USB Video"
+# struct v4l2_format: type, then a 200-byte union that is 8-byte aligned on
+# 64-bit (it contains pointers); v4l2_pix_format starts with width, height,
+# pixelformat.
+_V4L2_FMT_UNION_OFFSET = 8 if struct.calcsize("P") == 8 else 4
+_V4L2_FORMAT_SIZE = _V4L2_FMT_UNION_OFFSET + 200
+_V4L2_PIX_FORMAT_HEAD = struct.Struct("<III")
+VIDIOC_G_FMT = _IOWR('V', 4, _V4L2_FORMAT_SIZE)
+# Character device major number of video4linux nodes.
+VIDEO4LINUX_MAJOR = 81
+# Smallest frame size we treat as an HDMI capture resolution.
+HDMI_MIN_FRAME_SIZE = (1280, 720)
+# Pixel formats that v4l2src exposes as image/jpeg.
+V4L2_JPEG_PIXFORMATS = (
+    0x47504A4D,  # 'MJPG'
+    0x4745504A,  # 'JPEG'
+)
+# Format reset_device_state() puts the device into (width, height, MJPG).
+RESET_FORMAT = (640, 480, V4L2_JPEG_PIXFORMATS[0])
 
 
 def _round_even(value: int) -> int:
@@ -57,6 +199,14 @@ def _compute_height_for_16_9(width: int) -> int:
     return _round_even(max(height, 2))
 
 
+def _parse_geometry(geometry: str) -> Optional[tuple]:
+    """Parse a WIDTHxHEIGHT+X+Y geometry string into (w, h, x, y) ints."""
+    match = _GEOMETRY_RE.match(geometry)
+    if not match:
+        return None
+    return tuple(int(group) for group in match.groups())
+
+
 def _compute_width_for_16_9(height: int) -> int:
     """Compute a 16:9 width for the given height."""
     width = int(round(height * 16 / 9))
@@ -71,8 +221,6 @@ def setup_gstreamer_debug():
 
     By default, we keep GStreamer logs quiet to avoid drowning out app logs.
     """
-    import sys
-
     argv = set(sys.argv)
 
     # If the user explicitly requests GStreamer logs, enable them.
@@ -93,6 +241,10 @@ def setup_gstreamer_debug():
 # Setup debug environment before GStreamer initialization
 setup_gstreamer_debug()
 
+# App debug logs; level is set from --debug in main(). Messages are passed
+# with %-style args so nothing is formatted unless debug output is enabled.
+logger = logging.getLogger("hdmi-usb")
+
 Gst.init(None)
 
 # =============================================================================
@@ -126,9 +278,380 @@ atexit.register(cleanup_all)
 # Utility Functions
 # =============================================================================
 
+# (epoch second, formatted string) of the last timestamp() call. Replaced
+# as a whole so threads never see a second paired with another's string.
+_timestamp_cache = (None, "")
+
+
 def timestamp() -> str:
-    """Return current timestamp in standard format."""
-    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    """Return current timestamp in standard format.
+
+    Status lines come in bursts, so the string is reused within a second.
+    """
+    global _timestamp_cache
+    now = int(time.time())
+    cached_second, cached = _timestamp_cache
+    if now != cached_second:
+        cached = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now))
+        _timestamp_cache = (now, cached)
+    return cached
+
+
+def _noop(*_args, **_kwargs) -> None:
+    """Stand-in for debug log helpers when --debug is off."""
+
+
+@functools.lru_cache(maxsize=None)
+def element_usable(factory_name: str) -> bool:
+    """Return True if a GStreamer element exists and can reach READY.
+
+    Hardware elements can be registered even when the GPU/driver behind them
+    is unusable, so a factory lookup alone isn't enough. The answer is cached
+    for the life of the process, as opening the element touches the driver.
+    """
+    if not Gst.ElementFactory.find(factory_name):
+        return False
+    element = Gst.ElementFactory.make(factory_name, None)
+    if not element:
+        return False
+    try:
+        return element.set_state(Gst.State.READY) != Gst.StateChangeReturn.FAILURE
+    finally:
+        element.set_state(Gst.State.NULL)
+
+
+def v4l2_capture_pixelformats(fd: int) -> list:
+    """Return the capture pixel formats (fourcc ints) a V4L2 device offers."""
+    formats = []
+    index = 0
+    while True:
+        buf = bytearray(_V4L2_FMTDESC.pack(index, V4L2_BUF_TYPE_VIDEO_CAPTURE, 0, b"", 0, 0, 0, 0, 0))
+        try:
+            fcntl.ioctl(fd, VIDIOC_ENUM_FMT, buf)
+        except OSError as e:
+            # EINVAL marks the end of the list.
+            if e.errno == errno.EINVAL:
+                break
+            raise
+        formats.append(_V4L2_FMTDESC.unpack(buf)[4])
+        index += 1
+    return formats
+
+
+def v4l2_sysfs_name(device: str) -> str:
+    """Return the name sysfs reports for a /dev/videoN node ('' if unknown)."""
+    node = os.path.basename(device)
+    try:
+        with open(f"/sys/class/video4linux/{node}/name") as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def v4l2_device_caps(fd: int) -> int:
+    """Return the V4L2 capability flags of the opened device node."""
+    buf = bytearray(_V4L2_CAPABILITY.size)
+    fcntl.ioctl(fd, VIDIOC_QUERYCAP, buf)
+    capabilities, device_caps = _V4L2_CAPABILITY.unpack(buf)[4:6]
+    # device_caps describes this node; capabilities covers the whole device.
+    if capabilities & V4L2_CAP_DEVICE_CAPS:
+        return device_caps
+    return capabilities
+
+
+def v4l2_frame_sizes(fd: int, pixelformat: int):
+    """Yield (width, height) frame sizes for a pixel format.
+
+    For stepwise/continuous ranges only the maximum size is yielded.
+    """
+    index = 0
+    while True:
+        buf = bytearray(_V4L2_FRMSIZEENUM.pack(index, pixelformat, 0, 0, 0, 0, 0, 0, 0, 0, 0))
+        try:
+            fcntl.ioctl(fd, VIDIOC_ENUM_FRAMESIZES, buf)
+        except OSError as e:
+            if e.errno == errno.EINVAL:
+                return
+            raise
+        fields = _V4L2_FRMSIZEENUM.unpack(buf)
+        if fields[2] == V4L2_FRMSIZE_TYPE_DISCRETE:
+            yield fields[3], fields[4]
+        else:
+            # Stepwise: min_width, max_width, step_width, min_height, max_height, ...
+            yield fields[4], fields[7]
+            return
+        index += 1
+
+
+def v4l2_supports_frame_size(fd: int, min_width: int, min_height: int) -> bool:
+    """Return True if any capture format offers at least the given frame size."""
+    for pixelformat in v4l2_capture_pixelformats(fd):
+        for width, height in v4l2_frame_sizes(fd, pixelformat):
+            if width >= min_width and height >= min_height:
+                return True
+    return False
+
+
+def _alsa_card_has_capture(card_num: str) -> bool:
+    """Return True if /proc/asound/card<N> lists a capture PCM (pcm*c)."""
+    try:
+        names = os.listdir(f"/proc/asound/card{card_num}")
+    except OSError:
+        return False
+    return any(n.startswith('pcm') and n.endswith('c') for n in names)
+
+
+def v4l2_capture_format(fd: int) -> tuple:
+    """Return the current capture format as (width, height, pixelformat)."""
+    buf = bytearray(_V4L2_FORMAT_SIZE)
+    struct.pack_into("<I", buf, 0, V4L2_BUF_TYPE_VIDEO_CAPTURE)
+    fcntl.ioctl(fd, VIDIOC_G_FMT, buf)
+    return _V4L2_PIX_FORMAT_HEAD.unpack_from(buf, _V4L2_FMT_UNION_OFFSET)
+
+
+def v4l2_request_buffers(fd: int, count: int) -> None:
+    """Request (or with count=0, free) MMAP capture buffers."""
+    buf = bytearray(_V4L2_REQUESTBUFFERS.pack(count, V4L2_BUF_TYPE_VIDEO_CAPTURE, V4L2_MEMORY_MMAP))
+    fcntl.ioctl(fd, VIDIOC_REQBUFS, buf)
+
+
+# libasound handle for alsa_capture_available(); False once loading failed.
+_alsa_lib = None
+_alsa_error_handler = None
+SND_PCM_STREAM_CAPTURE = 1
+SND_PCM_NONBLOCK = 1
+
+
+def alsa_capture_available(device_spec: str) -> Optional[bool]:
+    """Check whether an ALSA capture PCM can be opened right now.
+
+    Opens the PCM non-blocking through libasound and closes it again, which
+    tells us whether it is busy without recording anything. Returns None if
+    libasound can't be loaded.
+    """
+    global _alsa_lib, _alsa_error_handler
+    if _alsa_lib is None:
+        try:
+            lib = ctypes.CDLL('libasound.so.2')
+        except OSError:
+            _alsa_lib = False
+            return None
+        # Keep libasound from printing its own diagnostics for failed opens.
+        handler_type = ctypes.CFUNCTYPE(
+            None, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p, ctypes.c_int, ctypes.c_char_p
+        )
+        _alsa_error_handler = handler_type(lambda *_args: None)
+        lib.snd_lib_error_set_handler(_alsa_error_handler)
+        lib.snd_pcm_open.argtypes = [
+            ctypes.POINTER(ctypes.c_void_p), ctypes.c_char_p, ctypes.c_int, ctypes.c_int
+        ]
+        lib.snd_pcm_open.restype = ctypes.c_int
+        lib.snd_pcm_close.argtypes = [ctypes.c_void_p]
+        lib.snd_pcm_close.restype = ctypes.c_int
+        _alsa_lib = lib
+    if _alsa_lib is False:
+        return None
+
+    pcm = ctypes.c_void_p()
+    rc = _alsa_lib.snd_pcm_open(
+        ctypes.byref(pcm), device_spec.encode(), SND_PCM_STREAM_CAPTURE, SND_PCM_NONBLOCK
+    )
+    if rc < 0:
+        return False
+    _alsa_lib.snd_pcm_close(pcm)
+    return True
+
+
+def _find_pids_by_cmdline(cmd_re: re.Pattern) -> list:
+    """Return PIDs whose command line matches `cmd_re` (like `pgrep -f`).
+
+    Scans /proc directly rather than spawning pgrep.
+    """
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/cmdline', 'rb') as f:
+                raw = f.read()
+        except OSError:
+            # Process exited or is not readable.
+            continue
+        if not raw:
+            # Kernel threads have an empty cmdline.
+            continue
+        cmdline = raw.rstrip(b'\0').replace(b'\0', b' ').decode('utf-8', 'replace')
+        if cmd_re.search(cmdline):
+            pids.append(int(entry))
+    return pids
+
+
+@functools.lru_cache(maxsize=None)
+def _tool_path(name: str) -> Optional[str]:
+    """Resolve a tool name to an absolute path once (None if not installed)."""
+    return shutil.which(name)
+
+
+def run_tool(argv: list, timeout: float, discard_stdout: bool = False) -> subprocess.CompletedProcess:
+    """Run a tool and capture its text output.
+
+    The executable is resolved to an absolute path and close_fds is off, which
+    lets CPython use its posix_spawn fast path instead of fork+exec. Our own
+    descriptors are non-inheritable by default, so nothing leaks. A missing
+    tool (including a None path from _tool_path) raises FileNotFoundError.
+    With `discard_stdout`, only stderr is captured (stdout goes to /dev/null).
+    """
+    path = _tool_path(argv[0]) if argv[0] else None
+    if not path:
+        raise FileNotFoundError(errno.ENOENT, "tool not found", argv[0])
+    return subprocess.run(
+        [path, *argv[1:]],
+        stdout=subprocess.DEVNULL if discard_stdout else subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        timeout=timeout,
+        close_fds=False,
+    )
+
+
+def run_quiet(argv: list, timeout: float) -> Optional[int]:
+    """Run a short-lived tool with all output discarded; return its exit code.
+
+    Like run_tool(), this takes CPython's posix_spawn fast path, which avoids
+    duplicating this (large, GStreamer-laden) process the way fork does, and
+    waits for the child without polling. Returns None if the tool could not
+    be started or did not finish within `timeout` seconds (it is killed in
+    that case).
+    """
+    path = _tool_path(argv[0]) if argv[0] else None
+    if not path:
+        return None
+    try:
+        return subprocess.run(
+            [path, *argv[1:]],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=timeout,
+            close_fds=False,
+        ).returncode
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+
+def _wait_for_exits(pids: list, timeout: float) -> list:
+    """Wait up to `timeout` seconds for (non-child) processes to exit.
+
+    Returns the PIDs still running afterwards. Uses pidfds where available so
+    one poll() wakes as soon as each process exits, however many there are.
+    """
+    deadline = time.monotonic() + timeout
+    fds = {}
+    try:
+        for pid in pids:
+            try:
+                fds[os.pidfd_open(pid)] = pid
+            except ProcessLookupError:
+                continue
+    except (AttributeError, OSError):
+        # No pidfd support (Python < 3.9 or kernel < 5.3): poll /proc every
+        # 10 ms. Unlike kill(pid, 0) this also works for processes we aren't
+        # permitted to signal.
+        for fd in fds:
+            os.close(fd)
+        remaining = list(pids)
+        while True:
+            remaining = [pid for pid in remaining if os.path.exists(f'/proc/{pid}')]
+            if not remaining or time.monotonic() >= deadline:
+                return remaining
+            time.sleep(0.01)
+
+    try:
+        poller = select.poll()
+        for fd in fds:
+            poller.register(fd, select.POLLIN)
+        pending = set(fds)
+        while pending:
+            wait_ms = int((deadline - time.monotonic()) * 1000)
+            if wait_ms <= 0:
+                break
+            for fd, _event in poller.poll(wait_ms):
+                poller.unregister(fd)
+                pending.discard(fd)
+        return [fds[fd] for fd in pending]
+    finally:
+        for fd in fds:
+            os.close(fd)
+
+
+def _terminate_processes(pids: list, escalation: tuple) -> None:
+    """Signal `pids` with each (signal, timeout) step until they have exited.
+
+    Every step signals all processes still running and then waits for them
+    together, so stopping several processes costs one wait per step rather
+    than one per process.
+    """
+    remaining = list(pids)
+    for sig, timeout in escalation:
+        signalled = []
+        for pid in remaining:
+            try:
+                os.kill(pid, sig)
+                signalled.append(pid)
+            except OSError:
+                # Already gone, or not ours to signal.
+                pass
+        remaining = _wait_for_exits(signalled, timeout)
+        if not remaining:
+            return
+
+
+def apply_realtime_scheduling() -> None:
+    """Move the calling thread off CPU 0 and under SCHED_RR.
+
+    On Linux, pid 0 makes both calls apply to the calling thread only.
+    Raises OSError on failure; SCHED_RR needs CAP_SYS_NICE or an
+    RLIMIT_RTPRIO allowance.
+    """
+    cpus = os.sched_getaffinity(0) - {0}
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    os.sched_setscheduler(0, os.SCHED_RR, os.sched_param(REALTIME_PRIORITY))
+
+
+def mark_clean_exit(video_device: str) -> None:
+    """Record that `video_device` was released cleanly by this run."""
+    try:
+        CLEAN_EXIT_MARKER_FILE.write_text(video_device)
+    except OSError:
+        pass
+
+
+def take_clean_exit_marker() -> Optional[str]:
+    """Return the device a recent clean exit released, consuming the marker.
+
+    Returns None if there is no marker or it is older than
+    CLEAN_EXIT_MAX_AGE_SECONDS.
+    """
+    path = str(CLEAN_EXIT_MARKER_FILE)
+    try:
+        age = time.time() - os.stat(path).st_mtime
+        with open(path) as f:
+            device = f.read().strip()
+        os.unlink(path)
+    except OSError:
+        return None
+    return device if 0 <= age < CLEAN_EXIT_MAX_AGE_SECONDS else None
+
+
+@functools.lru_cache(maxsize=None)
+def _instance_cmdline_re(script_name: str) -> re.Pattern:
+    """Compile the command-line pattern matching instances of `script_name`."""
+    return re.compile(rf'(^|.*/)(python3?|python)\s+.*{re.escape(script_name)}')
+
+
+def _instance_log(message: str, *args) -> None:
+    logger.debug("[INSTANCE] " + message, *args)
 
 
 def kill_existing_instances(script_name: str = "hdmi-rtsp-unified.py", debug_mode: bool = False):
@@ -138,11 +661,7 @@ def kill_existing_instances(script_name: str = "hdmi-rtsp-unified.py", debug_mod
     the same video/audio device.
     """
     current_pid = os.getpid()
-    killed_count = 0
-    
-    def log(message: str):
-        if debug_mode:
-            print(f"[INSTANCE] {message}")
+    log = _instance_log if debug_mode else _noop
     
     try:
         # Find all python processes running this script (excluding current process).
@@ -150,63 +669,30 @@ def kill_existing_instances(script_name: str = "hdmi-rtsp-unified.py", debug_mod
         # Important: we anchor the regex to the beginning of the command line so
         # we do NOT match wrapper processes like `timeout 30 python3 ...`.
         # If we kill `timeout`, it will typically terminate *this* process.
-        python_cmd_re = rf'(^|.*/)(python3?|python)\s+.*{re.escape(script_name)}'
-        result = subprocess.run(
-            ['pgrep', '-f', python_cmd_re],
-            capture_output=True,
-            text=True,
-            timeout=2
-        )
-        
-        if result.returncode == 0:
-            pids = [int(pid.strip()) for pid in result.stdout.strip().split('\n') if pid.strip()]
-            for pid in pids:
-                if pid != current_pid:
-                    try:
-                        log(f"Killing existing instance (PID: {pid})")
-                        os.kill(pid, signal.SIGTERM)
-                        killed_count += 1
-                        # Wait a bit for graceful shutdown
-                        time.sleep(0.5)
-                        # Force kill if still running
-                        try:
-                            os.kill(pid, 0)
-                            os.kill(pid, signal.SIGKILL)
-                        except OSError:
-                            pass
-                    except (OSError, ProcessLookupError):
-                        pass
+        instances = [pid for pid in _find_pids_by_cmdline(_instance_cmdline_re(script_name))
+                     if pid != current_pid]
+        for pid in instances:
+            log("Killing existing instance (PID: %s)", pid)
+        killed_count = len(instances)
+        # Give them a moment for graceful shutdown, then force kill
+        _terminate_processes(instances, ((signal.SIGTERM, 0.5), (signal.SIGKILL, 1.0)))
         
         # Also kill any orphaned gst-launch processes that might be using v4l2src
-        time.sleep(0.5)  # Give processes time to exit
-        result = subprocess.run(
-            ['pgrep', '-f', 'gst-launch-1.0.*v4l2src'],
-            capture_output=True,
-            text=True,
-            timeout=2
+        orphans = _find_pids_by_cmdline(_GST_LAUNCH_V4L2_RE)
+        for pid in orphans:
+            log("Killing orphaned GStreamer process (PID: %s)", pid)
+        # SIGINT lets gst-launch shut the pipeline down (and send EOS under -e)
+        # so v4l2src releases the device cleanly; escalate only if it doesn't exit.
+        _terminate_processes(
+            orphans,
+            ((signal.SIGINT, 1.0), (signal.SIGTERM, 0.2), (signal.SIGKILL, 1.0)),
         )
         
-        if result.returncode == 0:
-            gst_pids = [int(pid.strip()) for pid in result.stdout.strip().split('\n') if pid.strip()]
-            for pid in gst_pids:
-                try:
-                    log(f"Killing orphaned GStreamer process (PID: {pid})")
-                    os.kill(pid, signal.SIGTERM)
-                    time.sleep(0.2)
-                    try:
-                        os.kill(pid, 0)
-                        os.kill(pid, signal.SIGKILL)
-                    except OSError:
-                        pass
-                except (OSError, ProcessLookupError):
-                    pass
-        
         if killed_count > 0:
-            log(f"Killed {killed_count} existing instance(s)")
-            time.sleep(1)  # Give processes time to fully exit
+            log("Killed %s existing instance(s)", killed_count)
             
-    except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError):
-        # pgrep not available or failed, try alternative method
+    except OSError:
+        # /proc not available; nothing we can do.
         pass
 
 
@@ -222,12 +708,22 @@ class HDMIDeviceDetector:
 
     def __init__(self, debug_mode: bool = False):
         self.debug_mode = debug_mode
+        if not debug_mode:
+            self.log = _noop
         self.audio_force_card = os.environ.get('AUDIO_FORCE_CARD', '')
-
-    def log(self, message: str) -> None:
-        """Print log message if debug mode is enabled."""
-        if self.debug_mode:
-            print(f"[INFO] {message}")
+        # Per-device MJPEG support; capabilities don't change while running.
+        self._mjpeg_supported = {}
+        # Per-device V4L2 capability flags from VIDIOC_QUERYCAP.
+        self._device_caps = {}
+        # sysfs/procfs lookups; detection runs once per process.
+        self._usb_tail_cache = {}
+        self._alsa_cards_cache = None
+        self._alsa_card_names_cache = None
+        self._card_capture_cache = {}
+
+    def log(self, message: str, *args) -> None:
+        """Log a debug message (shown with --debug)."""
+        logger.debug("[INFO] " + message, *args)
 
     def is_video_hdmi_usb(self, device: str) -> bool:
         """Check if device is a video HDMI capture device.
@@ -238,115 +734,198 @@ class HDMIDeviceDetector:
         - Better error logging
         - Multiple resolution pattern matching
         """
-        # First check if device file exists and is accessible
-        if not os.path.exists(device):
-            self.log(f"Device {device} does not exist")
+        # First check the node exists and is a video4linux character device
+        try:
+            st = os.stat(device)
+        except FileNotFoundError:
+            self.log("Device %s does not exist", device)
+            return False
+        except OSError as e:
+            self.log("Cannot access device %s: %s", device, e)
             return False
+        if not stat.S_ISCHR(st.st_mode) or os.major(st.st_rdev) != VIDEO4LINUX_MAJOR:
+            self.log("Device %s is not a video4linux device node", device)
+            return False
+
+        # The sysfs name rejects other cameras without touching the driver,
+        # and a known adapter name makes the resolution probe unnecessary.
+        name = v4l2_sysfs_name(device)
+        if name and 'USB Video' not in name:
+            self.log("Device %s (%s) is not a USB Video device", device, name)
+            return False
+        known_adapter = HDMI_USB_DEVICE_NAME in name
         
-        # Check if device is readable (not locked by another process)
+        # Opening the node doubles as the accessibility check (the same fd is
+        # used for the capability queries below).
         try:
-            with open(device, 'rb') as f:
-                pass
+            fd = os.open(device, os.O_RDWR | os.O_NONBLOCK | os.O_CLOEXEC)
         except PermissionError:
-            self.log(f"Device {device} is not accessible (may be in use by another process)")
+            self.log("Device %s is not accessible (may be in use by another process)", device)
             return False
-        except Exception as e:
-            self.log(f"Cannot access device {device}: {e}")
+        except OSError as e:
+            self.log("Cannot access device %s: %s", device, e)
             return False
-        
+
+        try:
+            caps = v4l2_device_caps(fd)
+            self._device_caps[device] = caps
+            if not caps & V4L2_CAP_VIDEO_CAPTURE:
+                self.log("Device %s does not have 'Video Capture' capability", device)
+                return False
+
+            # Check for high resolution support (HDMI capture devices)
+            if known_adapter:
+                return True
+            if not v4l2_supports_frame_size(fd, *HDMI_MIN_FRAME_SIZE):
+                self.log("Device %s does not report expected HDMI resolutions", device)
+                # Still allow the device if it has Video Capture - resolution might be negotiated at runtime
+                self.log("Warning: Device %s has Video Capture but no expected HDMI resolutions found - will try anyway", device)
+            return True
+        except OSError as e:
+            if e.errno != errno.ENOTTY:
+                self.log("Error querying device %s: %s", device, e)
+                return False
+        finally:
+            os.close(fd)
+
+        # Not answering V4L2 ioctls directly; let v4l2-ctl have a go.
+        return self._is_video_hdmi_usb_v4l2ctl(device)
+
+    def _is_video_hdmi_usb_v4l2ctl(self, device: str) -> bool:
+        """Fallback for is_video_hdmi_usb() that parses `v4l2-ctl --all`."""
         try:
-            result = subprocess.run(
+            result = run_tool(
                 ['v4l2-ctl', '-d', device, '--all'],
-                capture_output=True,
-                text=True,
-                timeout=SUBPROCESS_TIMEOUT_SECONDS
+                timeout=SUBPROCESS_TIMEOUT_SECONDS,
             )
             
             # Log stderr if there are errors
             if result.stderr:
-                self.log(f"v4l2-ctl stderr for {device}: {result.stderr}")
+                self.log("v4l2-ctl stderr for %s: %s", device, result.stderr)
             
             # If command failed, log the error
             if result.returncode != 0:
-                self.log(f"v4l2-ctl failed for {device} (return code: {result.returncode})")
+                self.log("v4l2-ctl failed for %s (return code: %s)", device, result.returncode)
                 if result.stderr:
-                    self.log(f"Error: {result.stderr}")
+                    self.log("Error: %s", result.stderr)
                 return False
             
             info = result.stdout
             
             if not info:
-                self.log(f"No output from v4l2-ctl for {device}")
+                self.log("No output from v4l2-ctl for %s", device)
                 return False
             
             # Check for Video Capture capability
             if 'Video Capture' not in info:
-                self.log(f"Device {device} does not have 'Video Capture' capability")
+                self.log("Device %s does not have 'Video Capture' capability", device)
                 if self.debug_mode:
-                    lines = info.splitlines()[:10]
-                    self.log(f"Sample output from {device}: {lines}")
+                    # Only the first lines are shown; don't split the rest.
+                    lines = info.split('\n', 10)[:10]
+                    self.log("Sample output from %s: %s", device, lines)
                 return False
             
             # Check for high resolution support (HDMI capture devices)
-            # Try multiple patterns to catch different formats
-            resolution_patterns = [
-                r'1920.*1080',
-                r'1280.*720',
-                r'1920x1080',
-                r'1280x720',
-                r'Width/Height.*1920.*1080',
-                r'Width/Height.*1280.*720'
-            ]
-            
-            has_resolution = any(re.search(pattern, info, re.IGNORECASE) for pattern in resolution_patterns)
+            has_resolution = _HDMI_RESOLUTION_RE.search(info) is not None
             
             if not has_resolution:
-                self.log(f"Device {device} does not report expected HDMI resolutions")
+                self.log("Device %s does not report expected HDMI resolutions", device)
                 if self.debug_mode:
-                    format_lines = [line for line in info.splitlines() 
-                                  if 'Size:' in line or 'Width/Height' in line or 'fmt' in line.lower()]
+                    format_lines = [line for line in info.splitlines() if _FORMAT_LINE_RE.search(line)]
                     if format_lines:
-                        self.log(f"Available formats/resolutions for {device}: {format_lines[:5]}")
+                        self.log("Available formats/resolutions for %s: %s", device, format_lines[:5])
                 # Still allow the device if it has Video Capture - resolution might be negotiated at runtime
-                self.log(f"Warning: Device {device} has Video Capture but no expected HDMI resolutions found - will try anyway")
+                self.log("Warning: Device %s has Video Capture but no expected HDMI resolutions found - will try anyway", device)
                 return True  # Allow it - GStreamer can negotiate formats
             
             return True
 
         except subprocess.TimeoutExpired:
-            self.log(f"Timeout querying device {device}")
+            self.log("Timeout querying device %s", device)
             return False
         except subprocess.CalledProcessError as e:
-            self.log(f"Error querying device {device}: {e}")
+            self.log("Error querying device %s: %s", device, e)
             if e.stderr:
-                self.log(f"Error details: {e.stderr}")
+                self.log("Error details: %s", e.stderr)
             return False
         except FileNotFoundError:
             print("❌ ERROR: v4l2-ctl not found. Please install v4l-utils: sudo apt install v4l-utils", file=sys.stderr)
             return False
         except Exception as e:
-            self.log(f"Unexpected error checking device {device}: {e}")
+            self.log("Unexpected error checking device %s: %s", device, e)
             return False
 
+    def _query_capabilities(self, device: str) -> Optional[int]:
+        """Return the device's V4L2 capability flags, or None if it can't be queried.
+
+        Served from the result of is_video_hdmi_usb() when available.
+        """
+        caps = self._device_caps.get(device)
+        if caps is not None:
+            return caps
+        try:
+            fd = os.open(device, os.O_RDWR | os.O_NONBLOCK | os.O_CLOEXEC)
+        except OSError:
+            return None
+        try:
+            caps = v4l2_device_caps(fd)
+        except OSError:
+            return None
+        finally:
+            os.close(fd)
+        self._device_caps[device] = caps
+        return caps
+
+    def _current_format(self, device: str) -> Optional[tuple]:
+        """Return (width, height, pixelformat) of the capture format, or None."""
+        try:
+            fd = os.open(device, os.O_RDWR | os.O_NONBLOCK | os.O_CLOEXEC)
+        except OSError:
+            return None
+        try:
+            return v4l2_capture_format(fd)
+        except OSError:
+            return None
+        finally:
+            os.close(fd)
+
     def check_device_streaming(self, video_dev: str) -> bool:
         """Check if device can start streaming (detect bad state).
         
-        From hdmi-usb.py - tests if device is in a usable state.
+        From hdmi-usb.py - tests if device is in a usable state. Issues
+        REQBUFS/STREAMON/STREAMOFF directly; only a failing STREAMON counts
+        as a bad state (a busy or unopenable device is reported elsewhere).
         """
         try:
-            # Try a simple streaming test
-            result = subprocess.run(
-                ['v4l2-ctl', '-d', video_dev, '--stream-mmap', '--stream-count=1', '--stream-to=/dev/null'],
-                capture_output=True,
-                text=True,
-                timeout=2
-            )
-            # If STREAMON fails, we'll get an error
-            if 'STREAMON' in result.stderr and 'error' in result.stderr.lower():
+            fd = os.open(video_dev, os.O_RDWR | os.O_NONBLOCK | os.O_CLOEXEC)
+        except OSError as e:
+            self.log("Cannot open %s for streaming check: %s", video_dev, e)
+            return True
+
+        buf_type = _V4L2_BUF_TYPE.pack(V4L2_BUF_TYPE_VIDEO_CAPTURE)
+        try:
+            try:
+                v4l2_request_buffers(fd, 1)
+            except OSError as e:
+                self.log("VIDIOC_REQBUFS failed on %s: %s", video_dev, e)
+                return True
+
+            try:
+                fcntl.ioctl(fd, VIDIOC_STREAMON, buf_type)
+            except OSError as e:
+                self.log("VIDIOC_STREAMON failed on %s: %s", video_dev, e)
                 return False
+
+            fcntl.ioctl(fd, VIDIOC_STREAMOFF, buf_type)
             return True
-        except Exception:
-            return False
+        except OSError:
+            return True
+        finally:
+            try:
+                v4l2_request_buffers(fd, 0)
+            except OSError:
+                pass
+            os.close(fd)
 
     def reset_device_state(self, video_dev: str) -> bool:
         """Reset device state by closing any open streams.
@@ -355,14 +934,8 @@ class HDMIDeviceDetector:
         """
         try:
             # Try to query the device - this will fail if device is truly broken
-            result = subprocess.run(
-                ['v4l2-ctl', '-d', video_dev, '--all'],
-                capture_output=True,
-                text=True,
-                timeout=2
-            )
-            if result.returncode != 0:
-                self.log(f"Warning: Cannot query device {video_dev}, may be in bad state")
+            if self._query_capabilities(video_dev) is None:
+                self.log("Warning: Cannot query device %s, may be in bad state", video_dev)
                 return False
             
             # Check if device can stream
@@ -375,118 +948,199 @@ class HDMIDeviceDetector:
                 print("     3. Reload the driver: sudo modprobe -r uvcvideo && sudo modprobe uvcvideo", file=sys.stderr)
                 return False
             
+            # Already in the reset format: nothing to do.
+            if self._current_format(video_dev) == RESET_FORMAT:
+                return True
+
             # Try to set format explicitly to reset device state
-            subprocess.run(
+            run_quiet(
                 ['v4l2-ctl', '-d', video_dev, '--set-fmt-video=pixelformat=MJPG,width=640,height=480'],
-                capture_output=True,
-                timeout=2
+                timeout=2,
             )
             
             # Small delay to let device settle
             time.sleep(0.2)
             return True
         except Exception as e:
-            self.log(f"Error resetting device state: {e}")
+            self.log("Error resetting device state: %s", e)
             return False
 
+    def check_mjpeg_support(self, video_dev: str) -> bool:
+        """Check (once per device) whether the device can output MJPEG."""
+        cached = self._mjpeg_supported.get(video_dev)
+        if cached is not None:
+            return cached
+
+        try:
+            fd = os.open(video_dev, os.O_RDWR | os.O_NONBLOCK | os.O_CLOEXEC)
+            try:
+                formats = v4l2_capture_pixelformats(fd)
+            finally:
+                os.close(fd)
+            supported = any(fmt in V4L2_JPEG_PIXFORMATS for fmt in formats)
+        except OSError:
+            # Fall back to v4l2-ctl if the device can't be queried directly.
+            try:
+                result = run_tool(
+                    ['v4l2-ctl', '-d', video_dev, '--list-formats-ext'],
+                    timeout=SUBPROCESS_TIMEOUT_SECONDS,
+                )
+                supported = ('MJPG' in result.stdout) or ('MJPEG' in result.stdout)
+            except Exception:
+                supported = True
+
+        self._mjpeg_supported[video_dev] = supported
+        return supported
+
     def _extract_usb_path_tail(self, device: str) -> Optional[str]:
         """Extract USB path tail for video device."""
+        if device not in self._usb_tail_cache:
+            self._usb_tail_cache[device] = self._read_usb_path_tail(device)
+        return self._usb_tail_cache[device]
+
+    def _read_usb_path_tail(self, device: str) -> Optional[str]:
+        """Resolve the USB path tail for a video device from sysfs."""
         device_node = os.path.basename(device)
         sys_device_path = f"/sys/class/video4linux/{device_node}/device"
 
-        if not os.path.exists(sys_device_path):
-            return None
-
         try:
-            real_path = os.path.realpath(sys_device_path)
-            usb_path_matches = re.findall(r'\d+-[\d.]+', real_path)
-            return usb_path_matches[-1] if usb_path_matches else None
-        except Exception:
+            # As for sound cards, the link target ends in the USB interface
+            # (e.g. ../../../1-1.2:1.0); no need to resolve the whole path.
+            target = os.readlink(sys_device_path)
+        except OSError:
             return None
 
-    def _find_alsa_card_by_usb_tail(self, usb_tail: str) -> Optional[str]:
-        """Find ALSA card matching USB path tail."""
-        sound_class_path = Path('/sys/class/sound')
+        usb_path_matches = _USB_TAIL_RE.findall(target.rsplit('/', 1)[-1])
+        return usb_path_matches[-1] if usb_path_matches else None
 
-        for card_path in sound_class_path.glob('card*'):
-            if not card_path.is_dir():
-                continue
+    def _alsa_cards_by_usb_tail(self) -> dict:
+        """Map USB path tail -> (card number, has capture PCM), built once."""
+        if self._alsa_cards_cache is None:
+            self._alsa_cards_cache = self._scan_alsa_cards()
+        return self._alsa_cards_cache
 
-            card_device_path = card_path / 'device'
-            if not card_device_path.exists():
-                continue
+    def _alsa_card_names(self) -> dict:
+        """Map ALSA card number -> card id, read once from /proc/asound/cards."""
+        if self._alsa_card_names_cache is None:
+            try:
+                with open("/proc/asound/cards") as f:
+                    cards = f.read()
+            except OSError:
+                cards = ""
+            self._alsa_card_names_cache = {
+                num: card_id for num, card_id in _ALSA_CARD_LINE_RE.findall(cards)
+            }
+        return self._alsa_card_names_cache
+
+    def _scan_alsa_cards(self) -> dict:
+        """Walk /sys/class/sound for _alsa_cards_by_usb_tail()."""
+        cards = {}
+        try:
+            with os.scandir('/sys/class/sound') as it:
+                # Order by card index so card2 wins over card10, as it would
+                # in /proc/asound/cards; a plain name sort breaks past card9.
+                entries = sorted(
+                    (e for e in it if e.name.startswith('card') and e.name[4:].isdigit()),
+                    key=lambda e: int(e.name[4:]),
+                )
+        except OSError:
+            return cards
 
+        for entry in entries:
             try:
-                real_device_path = os.path.realpath(card_device_path)
-                audio_usb_matches = re.findall(r'\d+-[\d.]+', real_device_path)
-                if not audio_usb_matches:
-                    continue
+                # The link target ends in the USB interface (e.g.
+                # ../../../1-1.2:1.1); only its last component matters.
+                target = os.readlink(os.path.join(entry.path, 'device'))
+            except OSError:
+                continue
 
-                # Match must be exact on the USB device path
-                if audio_usb_matches[-1] == usb_tail:
-                    card_number = card_path.name.replace('card', '')
+            audio_usb_matches = _USB_TAIL_RE.findall(target.rsplit('/', 1)[-1])
+            if not audio_usb_matches:
+                continue
 
-                    # Verify this card has a capture device
-                    asound_card_path = Path(f"/proc/asound/card{card_number}")
-                    if any(asound_card_path.glob('pcm*c')):
-                        return card_number
+            card_number = entry.name[len('card'):]
+            cards.setdefault(
+                audio_usb_matches[-1], (card_number, self._card_has_capture(card_number))
+            )
+        return cards
 
-                    self.log(f"Warning: Found audio card {card_number} on same "
-                            f"USB device, but it has no capture devices")
-                    return None
-            except Exception:
-                continue
+    def _card_has_capture(self, card_num: str) -> bool:
+        """Cached _alsa_card_has_capture()."""
+        card_num = str(card_num)
+        if card_num not in self._card_capture_cache:
+            self._card_capture_cache[card_num] = _alsa_card_has_capture(card_num)
+        return self._card_capture_cache[card_num]
 
-        return None
+    def _find_alsa_card_by_usb_tail(self, usb_tail: str) -> Optional[str]:
+        """Find ALSA card matching USB path tail."""
+        # Match must be exact on the USB device path
+        match = self._alsa_cards_by_usb_tail().get(usb_tail)
+        if not match:
+            return None
+
+        card_number, has_capture = match
+        if not has_capture:
+            self.log("Warning: Found audio card %s on same "
+                    "USB device, but it has no capture devices", card_number)
+            return None
+        return card_number
 
     def verify_audio_card(self, card_num: str) -> bool:
         """Verify audio card is valid and has capture capability."""
-        card_id_path = Path(f"/proc/asound/card{card_num}/id")
-        card_info = "unknown"
-
-        if card_id_path.exists():
-            try:
-                card_info = card_id_path.read_text().strip()
-                self.log(f"Audio card {card_num} ID: {card_info}")
-            except Exception:
-                pass
+        card_info = self._alsa_card_names().get(str(card_num), "unknown")
+        self.log("Audio card %s ID: %s", card_num, card_info)
 
         # Verify the card has capture capability
-        asound_path = Path(f"/proc/asound/card{card_num}")
-        if not any(asound_path.glob('pcm*c')):
+        if not self._card_has_capture(card_num):
             return False
 
         # Check if the card is USB-based
-        card_path = Path(f"/sys/class/sound/card{card_num}/device")
-        if card_path.exists():
-            try:
-                device_path = os.path.realpath(card_path)
-                if 'usb' in device_path:
-                    self.log(f"Verified: Audio card {card_num} ({card_info}) "
-                            f"is a USB device with capture capability")
-                    return True
-            except Exception:
-                pass
+        # (realpath() of a missing link is the link path itself, which has no
+        # 'usb' component, so no separate exists() check is needed.)
+        device_path = os.path.realpath(f"/sys/class/sound/card{card_num}/device")
+        if 'usb' in device_path:
+            self.log("Verified: Audio card %s (%s) "
+                    "is a USB device with capture capability", card_num, card_info)
+            return True
 
-        self.log(f"Warning: Could not verify audio card {card_num} "
-                f"as a USB capture device")
+        self.log("Warning: Could not verify audio card %s "
+                "as a USB capture device", card_num)
         return True
 
     def pick_nodes_by_name(self) -> list:
-        """Get list of potential video devices."""
+        """Get list of potential video devices.
+
+        Reads the device names from /sys/class/video4linux; falls back to
+        `v4l2-ctl --list-devices` if sysfs doesn't list any nodes.
+        """
+        try:
+            entries = [e for e in os.scandir('/sys/class/video4linux')
+                       if e.name.startswith('video') and e.name[5:].isdigit()]
+        except OSError:
+            entries = []
+
+        if entries:
+            devices = []
+            for entry in sorted(entries, key=lambda e: int(e.name[5:])):
+                if HDMI_USB_DEVICE_NAME in v4l2_sysfs_name(entry.name):
+                    devices.append(f"/dev/{entry.name}")
+            return devices
+
+        return self._pick_nodes_by_name_v4l2ctl()
+
+    def _pick_nodes_by_name_v4l2ctl(self) -> list:
+        """Fallback for pick_nodes_by_name() that parses `v4l2-ctl --list-devices`."""
         try:
-            result = subprocess.run(
+            result = run_tool(
                 ['v4l2-ctl', '--list-devices'],
-                capture_output=True,
-                text=True,
-                timeout=SUBPROCESS_TIMEOUT_SECONDS
+                timeout=SUBPROCESS_TIMEOUT_SECONDS,
             )
 
             devices = []
             in_block = False
 
             for line in result.stdout.splitlines():
-                if 'USB Video: USB Video' in line:
+                if HDMI_USB_DEVICE_NAME in line:
                     in_block = True
                     continue
 
@@ -495,7 +1149,7 @@ class HDMIDeviceDetector:
                         in_block = False
                         continue
 
-                    match = re.search(r'/dev/video\d+', line)
+                    match = _DEV_VIDEO_RE.search(line)
                     if match:
                         devices.append(match.group(0))
 
@@ -505,19 +1159,35 @@ class HDMIDeviceDetector:
 
     def detect_video_device(self) -> Optional[str]:
         """Detect video HDMI capture device with state validation."""
-        for node in self.pick_nodes_by_name():
-            if node and self.is_video_hdmi_usb(node):
-                # Reset device state before returning
-                if self.reset_device_state(node):
-                    return node
-                else:
-                    self.log(f"Device {node} failed state validation, trying next device...")
+        nodes = [node for node in self.pick_nodes_by_name() if node]
+        if not nodes:
+            return None
+
+        # Probe all candidates concurrently, then take them in listing order
+        # so the preferred node still wins when several qualify.
+        with ThreadPoolExecutor(max_workers=min(8, len(nodes))) as executor:
+            qualifies = list(executor.map(self.is_video_hdmi_usb, nodes))
+
+        # A device the previous run released cleanly moments ago doesn't need
+        # the state check and format reset.
+        clean_device = take_clean_exit_marker()
+
+        for node, ok in zip(nodes, qualifies):
+            if not ok:
+                continue
+            if node == clean_device:
+                self.log("Skipping state reset for %s (recent clean exit)", node)
+                return node
+            # Reset device state before returning
+            if self.reset_device_state(node):
+                return node
+            self.log("Device %s failed state validation, trying next device...", node)
         return None
 
     def detect_audio_card(self, video_device: str) -> Optional[str]:
         """Detect audio card for the video device."""
         if self.audio_force_card:
-            self.log(f"Forcing ALSA card: {self.audio_force_card}")
+            self.log("Forcing ALSA card: %s", self.audio_force_card)
             return (self.audio_force_card 
                     if self.verify_audio_card(self.audio_force_card) 
                     else None)
@@ -527,19 +1197,19 @@ class HDMIDeviceDetector:
             self.log("Could not resolve USB path tail. Running video-only.")
             return None
 
-        self.log(f"USB path for video device: {usb_tail}")
+        self.log("USB path for video device: %s", usb_tail)
         audio_card = self._find_alsa_card_by_usb_tail(usb_tail)
 
         if audio_card:
-            self.log(f"Matched ALSA card by USB path: card {audio_card}")
+            self.log("Matched ALSA card by USB path: card %s", audio_card)
             if self.verify_audio_card(audio_card):
                 self.log("Audio verification passed - audio is from the "
                         "USB HDMI capture device")
                 return audio_card
             return None
 
-        self.log(f"No ALSA card matched USB path ({usb_tail}). "
-                f"Running video-only.")
+        self.log("No ALSA card matched USB path (%s). "
+                "Running video-only.", usb_tail)
         return None
 
 
@@ -564,6 +1234,8 @@ class LocalDisplayPipeline:
     ):
         self.rtsp_url = rtsp_url
         self.debug_mode = debug_mode
+        if not debug_mode:
+            self.log = _noop
         self.pipeline = None
         self.server = server  # Reference to RTSPServer for shutdown callback
         # Used to match the correct window in wmctrl output.
@@ -585,18 +1257,30 @@ class LocalDisplayPipeline:
         self._window_watch_id = None
         self._window_watch_window_id = None
         self._window_watch_last_geometry = None
+        self._window_watch_last_written = None
+        # Window tools for the non-GTK fallback, resolved once (None if missing).
+        self._wmctrl = _tool_path('wmctrl')
+        self._xwininfo = _tool_path('xwininfo')
+        self._xprop = _tool_path('xprop')
         self._window_watch_ignore_until = 0.0
         self._window_watch_last_w = None
         self._window_watch_last_h = None
         self._window_watch_adjusting_until = 0.0
-        
+
+        # Embedded preview window (GTK). When unavailable, the sink creates its
+        # own window and the wmctrl/xwininfo path above is used instead.
+        self._window = None
+        self._window_xid = None
+        self._videosink = None
+        self._window_pending_geometry = None
+        self._window_save_id = None
+
         # Register cleanup function for robust cleanup
         register_cleanup(self.stop)
 
-    def log(self, message: str) -> None:
-        """Print log message if debug mode is enabled."""
-        if self.debug_mode:
-            print(f"[LOCAL] {message}")
+    def log(self, message: str, *args) -> None:
+        """Log a debug message (shown with --debug)."""
+        logger.debug("[LOCAL] " + message, *args)
 
     def on_bus_message(self, bus, message):
         """Handle bus messages for local display pipeline."""
@@ -626,11 +1310,10 @@ class LocalDisplayPipeline:
                     GLib.idle_add(self.stop)
             else:
                 print(f"❌ Local Display ERROR: {error_msg}")
-                if self.debug_mode:
-                    print(f"   Debug: {debug_info}")
+                logger.debug("   Debug: %s", debug_info)
         elif msg_type == Gst.MessageType.WARNING and self.debug_mode:
             warn, _ = message.parse_warning()
-            print(f"⚠️  Local Display WARNING: {warn.message}")
+            logger.debug("⚠️  Local Display WARNING: %s", warn.message)
         elif msg_type == Gst.MessageType.EOS:
             self.log("End of stream reached")
             # EOS can also indicate window closure, trigger shutdown
@@ -640,9 +1323,7 @@ class LocalDisplayPipeline:
         elif msg_type == Gst.MessageType.STATE_CHANGED:
             if message.src == self.pipeline:
                 old_state, new_state, pending = message.parse_state_changed()
-                if self.debug_mode:
-                    self.log(f"State changed: {old_state.value_nick} -> "
-                            f"{new_state.value_nick}")
+                self.log("State changed: %s -> %s", old_state.value_nick, new_state.value_nick)
 
                 # Only attempt window operations once we are actually PLAYING.
                 # Before that, the sink window often doesn't exist yet.
@@ -660,12 +1341,17 @@ class LocalDisplayPipeline:
             return False
         self._playing_init_done = True
 
+        # Our own window was already created with the right geometry; nothing
+        # to find, restore or poll.
+        if self._window is not None:
+            return False
+
         # If the user requested a fixed window width, force a 16:9 size and
         # ignore saved window geometry (do not restore or overwrite it).
         if self.force_width:
             target_w = _round_even(max(int(self.force_width), 2))
             target_h = _compute_height_for_16_9(target_w)
-            self.log(f"Forcing local window size: {target_w}x{target_h} (16:9)")
+            self.log("Forcing local window size: %sx%s (16:9)", target_w, target_h)
 
             self._force_applied = self.apply_forced_window_size(target_w, target_h)
             self._force_attempts = 1
@@ -676,19 +1362,18 @@ class LocalDisplayPipeline:
                 if self._force_attempts >= 3:
                     return False
                 self._force_attempts += 1
-                self.log(f"Retrying forced window size (attempt {self._force_attempts}/3)...")
+                self.log("Retrying forced window size (attempt %s/3)...", self._force_attempts)
                 self._force_applied = self.apply_forced_window_size(target_w, target_h)
                 return not self._force_applied and self._force_attempts < 3
 
             GLib.timeout_add_seconds(2, retry_force)
             return False
 
-        if (not self._restore_applied and
-            all([self.restore_x, self.restore_y, self.restore_width, self.restore_height])):
-            # restore_x/restore_y may already include a sign (e.g. "-36", "+47").
+        if not self._restore_applied and self.restore_width is not None:
             self.log(
-                f"Applying saved window geometry after PLAYING: "
-                f"{self.restore_width}x{self.restore_height}{self.restore_x}{self.restore_y}"
+                "Applying saved window geometry after PLAYING: %sx%s%+d%+d",
+                self.restore_width, self.restore_height,
+                self.restore_x, self.restore_y,
             )
             self._restore_applied = self.apply_window_state()
 
@@ -702,7 +1387,7 @@ class LocalDisplayPipeline:
                 if self._restore_attempts >= 3:
                     return False
                 self._restore_attempts += 1
-                self.log(f"Retrying window restore (attempt {self._restore_attempts}/3)...")
+                self.log("Retrying window restore (attempt %s/3)...", self._restore_attempts)
                 self._restore_applied = self.apply_window_state()
                 return not self._restore_applied and self._restore_attempts < 3
 
@@ -724,40 +1409,36 @@ class LocalDisplayPipeline:
         
         try:
             geometry = self.window_state_file.read_text().strip()
-            self.log(f"Restoring window state: {geometry}")
+            self.log("Restoring window state: %s", geometry)
             
             # Parse geometry (format: WIDTHxHEIGHT+X+Y)
-            match = re.match(r'^(\d+)x(\d+)([+-]\d+)([+-]\d+)$', geometry)
-            if match:
-                self.restore_width = match.group(1)
-                self.restore_height = match.group(2)
-                self.restore_x = match.group(3)
-                self.restore_y = match.group(4)
+            parsed = _parse_geometry(geometry)
+            if parsed:
+                (self.restore_width, self.restore_height,
+                 self.restore_x, self.restore_y) = parsed
 
                 # Enforce 16:9 on restore.
                 #
                 # Choose the adjustment that produces the smaller change from the
                 # saved geometry: either keep width and adjust height, or keep
                 # height and adjust width.
-                try:
-                    w = int(self.restore_width)
-                    h = int(self.restore_height)
-                    h_from_w = _compute_height_for_16_9(w)
-                    w_from_h = _compute_width_for_16_9(h)
-
-                    if abs(h_from_w - h) <= abs(w_from_h - w):
-                        self.restore_height = str(h_from_w)
-                    else:
-                        self.restore_width = str(w_from_h)
-                except Exception:
-                    pass
+                w = self.restore_width
+                h = self.restore_height
+                h_from_w = _compute_height_for_16_9(w)
+                w_from_h = _compute_width_for_16_9(h)
+
+                if abs(h_from_w - h) <= abs(w_from_h - w):
+                    self.restore_height = h_from_w
+                else:
+                    self.restore_width = w_from_h
                 
-                self.log(f"Will restore to: {self.restore_width}x{self.restore_height} "
-                        f"at position {self.restore_x},{self.restore_y}")
+                self.log("Will restore to: %sx%s at position %s,%s",
+                         self.restore_width, self.restore_height,
+                         self.restore_x, self.restore_y)
             else:
-                self.log(f"Invalid geometry format: {geometry}")
+                self.log("Invalid geometry format: %s", geometry)
         except Exception as e:
-            self.log(f"Failed to read window state: {e}")
+            self.log("Failed to read window state: %s", e)
     
     def get_window_id(self, timeout: float = 5.0) -> Optional[str]:
         """Get window ID for GStreamer window.
@@ -772,13 +1453,11 @@ class LocalDisplayPipeline:
                 # Method 0 (most reliable): match windows by PID via `wmctrl -lp`.
                 # Output format: WIN_ID DESK PID WM_CLASS TITLE...
                 try:
-                    wmctrl_lp = subprocess.run(
-                        ['wmctrl', '-lp'],
-                        capture_output=True,
-                        text=True,
-                        timeout=1
-                    )
-                    if wmctrl_lp.returncode == 0:
+                    wmctrl_lp = run_tool(
+                        [self._wmctrl, '-lp'],
+                        timeout=1,
+                    ) if self._wmctrl else None
+                    if wmctrl_lp and wmctrl_lp.returncode == 0:
                         candidates = []
                         for line in wmctrl_lp.stdout.splitlines():
                             parts = line.split(None, 4)
@@ -813,38 +1492,34 @@ class LocalDisplayPipeline:
                         if candidates:
                             candidates.sort(reverse=True)
                             best = candidates[0][1]
-                            self.log(f"Found window ID by PID {self.owner_pid}: {best}")
+                            self.log("Found window ID by PID %s: %s", self.owner_pid, best)
                             return best
                 except Exception:
                     # wmctrl may be missing; fall back to other methods below.
                     pass
 
                 # Method 1: Look for window named "python3" (most common with Gst.parse_launch)
-                result = subprocess.run(
-                    ['xwininfo', '-name', 'python3'],
-                    capture_output=True,
-                    text=True,
-                    timeout=1
-                )
+                result = run_tool(
+                    [self._xwininfo, '-name', 'python3'],
+                    timeout=1,
+                ) if self._xwininfo else None
                 
-                if result.returncode == 0:
+                if result and result.returncode == 0:
                     for line in result.stdout.splitlines():
                         if 'Window id:' in line:
                             parts = line.split()
                             if len(parts) >= 4:
                                 window_id = parts[3]
-                                self.log(f"Found window ID by name 'python3': {window_id}")
+                                self.log("Found window ID by name 'python3': %s", window_id)
                                 return window_id
                 
                 # Method 2: Look for window with GStreamer class
-                result2 = subprocess.run(
-                    ['wmctrl', '-lx'],
-                    capture_output=True,
-                    text=True,
-                    timeout=1
-                )
+                result2 = run_tool(
+                    [self._wmctrl, '-lx'],
+                    timeout=1,
+                ) if self._wmctrl else None
                 
-                for line in result2.stdout.splitlines():
+                for line in (result2.stdout.splitlines() if result2 else ()):
                     line_l = line.lower()
                     if ('gstreamer' in line_l or
                         'ximagesink' in line_l or
@@ -853,25 +1528,25 @@ class LocalDisplayPipeline:
                         parts = line.split()
                         if len(parts) >= 1:
                             window_id = parts[0]
-                            self.log(f"Found window ID by class: {window_id}")
+                            self.log("Found window ID by class: %s", window_id)
                             return window_id
                             
             except Exception as e:
-                self.log(f"Error getting window ID: {e}")
+                self.log("Error getting window ID: %s", e)
             
             time.sleep(0.1)
         
-        self.log(f"Window not found after {timeout} seconds")
+        self.log("Window not found after %s seconds", timeout)
         return None
     
     def get_window_geometry(self, window_id: str) -> Optional[str]:
         """Get window geometry."""
+        if not self._xwininfo:
+            return None
         try:
-            result = subprocess.run(
-                ['xwininfo', '-id', window_id],
-                capture_output=True,
-                text=True,
-                timeout=1
+            result = run_tool(
+                [self._xwininfo, '-id', window_id],
+                timeout=1,
             )
             
             for line in result.stdout.splitlines():
@@ -889,21 +1564,15 @@ class LocalDisplayPipeline:
 
         Returns True if the geometry appears to have been applied.
         """
-        # Check if wmctrl is available
-        try:
-            subprocess.run(['which', 'wmctrl'], capture_output=True,
-                           check=True, timeout=1)
-        except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        if not self._wmctrl:
             self.log("wmctrl not available, window position not restored")
             return False
 
         try:
-            import time
-
-            target_x = int(self.restore_x)
-            target_y = int(self.restore_y)
-            target_w = int(self.restore_width)
-            target_h = int(self.restore_height)
+            target_x = self.restore_x
+            target_y = self.restore_y
+            target_w = self.restore_width
+            target_h = self.restore_height
             # Some window managers behave poorly with negative positions.
             # Clamp to 0 so at least size restore is reliable.
             apply_x = target_x if target_x >= 0 else 0
@@ -914,48 +1583,42 @@ class LocalDisplayPipeline:
                 # Clear those states first (and repeatedly, some WMs re-apply them).
                 # Some WMs ignore a combined remove list; do it one-by-one.
                 for state in ("fullscreen", "maximized_vert", "maximized_horz"):
-                    subprocess.run(
-                        ['wmctrl', '-i', '-r', window_id, '-b', f'remove,{state}'],
-                        capture_output=True,
-                        text=True,
-                        timeout=1
+                    run_quiet(
+                        [self._wmctrl, '-i', '-r', window_id, '-b', f'remove,{state}'],
+                        timeout=1,
                     )
 
             def _clear_size_hints() -> None:
                 # Some sinks set WM_NORMAL_HINTS that effectively clamp the window size
                 # (e.g., minimum width ~= negotiated video width). Removing these hints
                 # lets WMs apply the requested geometry.
+                if not self._xprop:
+                    return
                 try:
-                    subprocess.run(
-                        ['xprop', '-id', window_id, '-remove', 'WM_NORMAL_HINTS'],
-                        capture_output=True,
-                        text=True,
-                        timeout=1
+                    run_quiet(
+                        [self._xprop, '-id', window_id, '-remove', 'WM_NORMAL_HINTS'],
+                        timeout=1,
                     )
                 except Exception:
                     pass
 
             def _apply_geometry() -> subprocess.CompletedProcess:
-                return subprocess.run(
-                    ['wmctrl', '-i', '-r', window_id, '-e',
+                return run_tool(
+                    [self._wmctrl, '-i', '-r', window_id, '-e',
                      f"0,{apply_x},{apply_y},{target_w},{target_h}"],
-                    capture_output=True,
-                    text=True,
-                    timeout=1
+                    timeout=1,
+                    discard_stdout=True,
                 )
 
-            self.log(f"Applying window geometry to {window_id}...")
+            self.log("Applying window geometry to %s...", window_id)
 
             def _geometry_matches(geometry: Optional[str]) -> bool:
                 if not geometry:
                     return False
-                match = re.match(r'^(\d+)x(\d+)([+-]\d+)([+-]\d+)$', geometry)
-                if not match:
+                parsed = _parse_geometry(geometry)
+                if not parsed:
                     return False
-                current_w = int(match.group(1))
-                current_h = int(match.group(2))
-                current_x = int(match.group(3))
-                current_y = int(match.group(4))
+                current_w, current_h, current_x, current_y = parsed
                 return (
                     abs(current_x - apply_x) < 10 and
                     abs(current_y - apply_y) < 10 and
@@ -974,8 +1637,8 @@ class LocalDisplayPipeline:
                     current_geometry = self.get_window_geometry(window_id)
                     if _geometry_matches(current_geometry):
                         self.log(
-                            f"Window geometry applied: {target_w}x{target_h} "
-                            f"at {apply_x},{apply_y} (current={current_geometry})"
+                            "Window geometry applied: %sx%s at %s,%s (current=%s)",
+                            target_w, target_h, apply_x, apply_y, current_geometry,
                         )
                         return True
                     time.sleep(0.05)
@@ -995,12 +1658,10 @@ class LocalDisplayPipeline:
                 if pre_w != target_w or pre_h != target_h:
                     _clear_wm_state()
                     _clear_size_hints()
-                    subprocess.run(
-                        ['wmctrl', '-i', '-r', window_id, '-e',
+                    run_quiet(
+                        [self._wmctrl, '-i', '-r', window_id, '-e',
                          f"0,{apply_x},{apply_y},{pre_w},{pre_h}"],
-                        capture_output=True,
-                        text=True,
-                        timeout=1
+                        timeout=1,
                     )
                     time.sleep(0.10)
             except Exception:
@@ -1013,7 +1674,7 @@ class LocalDisplayPipeline:
 
                 result = _apply_geometry()
                 if result.returncode != 0 and self.debug_mode:
-                    self.log(f"wmctrl -e failed: {result.stderr.strip()}")
+                    self.log("wmctrl -e failed: %s", result.stderr.strip())
 
                 time.sleep(0.15)
                 current_geometry = self.get_window_geometry(window_id)
@@ -1021,44 +1682,39 @@ class LocalDisplayPipeline:
                     last_geometry = current_geometry
                     if _geometry_matches(current_geometry):
                         self.log(
-                            f"Window geometry applied: {target_w}x{target_h} "
-                            f"at {apply_x},{apply_y} (current={current_geometry})"
+                            "Window geometry applied: %sx%s at %s,%s (current=%s)",
+                            target_w, target_h, apply_x, apply_y, current_geometry,
                         )
                         return True
 
             if last_geometry:
                 self.log(
-                    f"Window geometry did not settle to saved state; last seen: {last_geometry}"
+                    "Window geometry did not settle to saved state; last seen: %s",
+                    last_geometry,
                 )
                 if self.debug_mode:
                     try:
-                        state_line = subprocess.run(
-                            ['xprop', '-id', window_id, '_NET_WM_STATE'],
-                            capture_output=True,
-                            text=True,
-                            timeout=1
+                        state_line = run_tool(
+                            [self._xprop, '-id', window_id, '_NET_WM_STATE'],
+                            timeout=1,
                         ).stdout.strip()
                         if state_line:
-                            self.log(f"Window state: {state_line}")
+                            self.log("Window state: %s", state_line)
                     except Exception:
                         pass
                     try:
-                        hints = subprocess.run(
-                            ['xprop', '-id', window_id, 'WM_NORMAL_HINTS'],
-                            capture_output=True,
-                            text=True,
-                            timeout=1
+                        hints = run_tool(
+                            [self._xprop, '-id', window_id, 'WM_NORMAL_HINTS'],
+                            timeout=1,
                         ).stdout.strip()
                         if hints:
-                            self.log(f"Window hints: {hints}")
+                            self.log("Window hints: %s", hints)
                     except Exception:
                         pass
                     try:
-                        info = subprocess.run(
-                            ['xwininfo', '-id', window_id, '-wm'],
-                            capture_output=True,
-                            text=True,
-                            timeout=2
+                        info = run_tool(
+                            [self._xwininfo, '-id', window_id, '-wm'],
+                            timeout=2,
                         ).stdout
                         for line in info.splitlines():
                             if 'Minimum Size' in line or 'Maximum Size' in line:
@@ -1067,29 +1723,23 @@ class LocalDisplayPipeline:
                         pass
             return False
         except Exception as e:
-            self.log(f"Failed to apply window state: {e}")
+            self.log("Failed to apply window state: %s", e)
             return False
 
     def _apply_window_size_to_window(self, window_id: str, width: int, height: int) -> bool:
         """Resize the window to (width, height) while keeping the current position."""
-        # Check if wmctrl is available
-        try:
-            subprocess.run(['which', 'wmctrl'], capture_output=True,
-                           check=True, timeout=1)
-        except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+        if not self._wmctrl:
             self.log("wmctrl not available, window size not applied")
             return False
 
         try:
-            import time
-
             # Keep current position if we can read it, otherwise default to 0,0.
             current_geometry = self.get_window_geometry(window_id)
             cur_x, cur_y = 0, 0
             if current_geometry:
-                match = re.match(r'^(\d+)x(\d+)([+-]\d+)([+-]\d+)$', current_geometry)
-                if match:
-                    cur_x, cur_y = int(match.group(3)), int(match.group(4))
+                parsed = _parse_geometry(current_geometry)
+                if parsed:
+                    cur_x, cur_y = parsed[2], parsed[3]
 
             target_w = _round_even(max(int(width), 2))
             target_h = _round_even(max(int(height), 2))
@@ -1097,46 +1747,42 @@ class LocalDisplayPipeline:
             def _clear_wm_state() -> None:
                 # Some WMs ignore a combined remove list; do it one-by-one.
                 for state in ("fullscreen", "maximized_vert", "maximized_horz"):
-                    subprocess.run(
-                        ['wmctrl', '-i', '-r', window_id, '-b', f'remove,{state}'],
-                        capture_output=True,
-                        text=True,
-                        timeout=1
+                    run_quiet(
+                        [self._wmctrl, '-i', '-r', window_id, '-b', f'remove,{state}'],
+                        timeout=1,
                     )
 
             def _clear_size_hints() -> None:
                 # Some sinks set WM_NORMAL_HINTS that effectively clamp the window size
                 # (e.g., minimum width ~= negotiated video width). Removing these hints
                 # lets WMs apply the requested geometry.
+                if not self._xprop:
+                    return
                 try:
-                    subprocess.run(
-                        ['xprop', '-id', window_id, '-remove', 'WM_NORMAL_HINTS'],
-                        capture_output=True,
-                        text=True,
-                        timeout=1
+                    run_quiet(
+                        [self._xprop, '-id', window_id, '-remove', 'WM_NORMAL_HINTS'],
+                        timeout=1,
                     )
                 except Exception:
                     pass
 
             def _apply_geometry() -> subprocess.CompletedProcess:
-                return subprocess.run(
-                    ['wmctrl', '-i', '-r', window_id, '-e',
+                return run_tool(
+                    [self._wmctrl, '-i', '-r', window_id, '-e',
                      f"0,{cur_x},{cur_y},{target_w},{target_h}"],
-                    capture_output=True,
-                    text=True,
-                    timeout=1
+                    timeout=1,
+                    discard_stdout=True,
                 )
 
-            self.log(f"Applying forced window size to {window_id}...")
+            self.log("Applying forced window size to %s...", window_id)
 
             def _size_matches(geometry: Optional[str]) -> bool:
                 if not geometry:
                     return False
-                match = re.match(r'^(\d+)x(\d+)([+-]\d+)([+-]\d+)$', geometry)
-                if not match:
+                parsed = _parse_geometry(geometry)
+                if not parsed:
                     return False
-                current_w = int(match.group(1))
-                current_h = int(match.group(2))
+                current_w, current_h = parsed[0], parsed[1]
                 return abs(current_w - target_w) < 10 and abs(current_h - target_h) < 10
 
             # Fast path: apply once and poll briefly.
@@ -1149,8 +1795,8 @@ class LocalDisplayPipeline:
                     current_geometry = self.get_window_geometry(window_id)
                     if _size_matches(current_geometry):
                         self.log(
-                            f"Forced window size applied: {target_w}x{target_h} "
-                            f"(current={current_geometry})"
+                            "Forced window size applied: %sx%s (current=%s)",
+                            target_w, target_h, current_geometry,
                         )
                         print(f"[{timestamp()}] 🪟 Local window geometry: {current_geometry}")
                         return True
@@ -1167,49 +1813,43 @@ class LocalDisplayPipeline:
 
                 result = _apply_geometry()
                 if result.returncode != 0 and self.debug_mode:
-                    self.log(f"wmctrl -e failed: {result.stderr.strip()}")
+                    self.log("wmctrl -e failed: %s", result.stderr.strip())
 
                 time.sleep(0.15)
                 current_geometry = self.get_window_geometry(window_id)
                 if current_geometry:
                     last_geometry = current_geometry
                     if _size_matches(current_geometry):
-                        self.log(f"Forced window size applied: {target_w}x{target_h} (current={current_geometry})")
+                        self.log("Forced window size applied: %sx%s (current=%s)", target_w, target_h, current_geometry)
                         print(f"[{timestamp()}] 🪟 Local window geometry: {current_geometry}")
                         return True
 
             if last_geometry:
-                self.log(f"Forced window size did not settle; last seen: {last_geometry}")
+                self.log("Forced window size did not settle; last seen: %s", last_geometry)
                 print(f"[{timestamp()}] 🪟 Local window geometry (last seen): {last_geometry}")
                 if self.debug_mode:
                     try:
-                        state_line = subprocess.run(
-                            ['xprop', '-id', window_id, '_NET_WM_STATE'],
-                            capture_output=True,
-                            text=True,
-                            timeout=1
+                        state_line = run_tool(
+                            [self._xprop, '-id', window_id, '_NET_WM_STATE'],
+                            timeout=1,
                         ).stdout.strip()
                         if state_line:
-                            self.log(f"Window state: {state_line}")
+                            self.log("Window state: %s", state_line)
                     except Exception:
                         pass
                     try:
-                        hints = subprocess.run(
-                            ['xprop', '-id', window_id, 'WM_NORMAL_HINTS'],
-                            capture_output=True,
-                            text=True,
-                            timeout=1
+                        hints = run_tool(
+                            [self._xprop, '-id', window_id, 'WM_NORMAL_HINTS'],
+                            timeout=1,
                         ).stdout.strip()
                         if hints:
-                            self.log(f"Window hints: {hints}")
+                            self.log("Window hints: %s", hints)
                     except Exception:
                         pass
                     try:
-                        info = subprocess.run(
-                            ['xwininfo', '-id', window_id, '-wm'],
-                            capture_output=True,
-                            text=True,
-                            timeout=2
+                        info = run_tool(
+                            [self._xwininfo, '-id', window_id, '-wm'],
+                            timeout=2,
                         ).stdout
                         for line in info.splitlines():
                             if 'Minimum Size' in line or 'Maximum Size' in line:
@@ -1218,13 +1858,12 @@ class LocalDisplayPipeline:
                         pass
             return False
         except Exception as e:
-            self.log(f"Failed to apply forced window size: {e}")
+            self.log("Failed to apply forced window size: %s", e)
             return False
 
     def apply_window_state(self) -> bool:
         """Apply window state after GStreamer starts."""
-        if not all([self.restore_x, self.restore_y, self.restore_width, 
-                   self.restore_height]):
+        if self.restore_width is None:
             return False
 
         # The window can take a few seconds to appear after the pipeline is set
@@ -1291,16 +1930,16 @@ class LocalDisplayPipeline:
                 if not geometry:
                     return True
 
+                parsed = _parse_geometry(geometry)
+
                 # Enforce a 16:9 window geometry: whenever the window becomes
                 # non-16:9, snap it back by adjusting the opposite dimension.
                 #
                 # We choose which dimension "drives" based on what changed most
                 # since the last tick (width vs height).
                 if time.time() >= self._window_watch_ignore_until:
-                    m = re.match(r'^(\d+)x(\d+)([+-]\d+)([+-]\d+)$', geometry)
-                    if m:
-                        w = int(m.group(1))
-                        h = int(m.group(2))
+                    if parsed:
+                        w, h = parsed[0], parsed[1]
 
                         # If we're in the middle of an adjustment we initiated,
                         # don't react to intermediate transient sizes.
@@ -1321,7 +1960,7 @@ class LocalDisplayPipeline:
                                     target_w = _compute_width_for_16_9(target_h)
 
                                 if abs(target_w - w) >= 2 or abs(target_h - h) >= 2:
-                                    self.log(f"Enforcing 16:9 window geometry: {target_w}x{target_h} (from {w}x{h})")
+                                    self.log("Enforcing 16:9 window geometry: %sx%s (from %sx%s)", target_w, target_h, w, h)
                                     # Avoid re-entrancy for a short window while WM applies changes.
                                     self._window_watch_adjusting_until = time.time() + 2.0
                                     self._apply_window_size_to_window(
@@ -1334,27 +1973,153 @@ class LocalDisplayPipeline:
 
                 if geometry != self._window_watch_last_geometry:
                     self._window_watch_last_geometry = geometry
-                    m = re.match(r'^(\d+)x(\d+)([+-]\d+)([+-]\d+)$', geometry)
-                    if m:
-                        self._window_watch_last_w = int(m.group(1))
-                        self._window_watch_last_h = int(m.group(2))
-
-                    # Do not write the transient initial geometry.
-                    if time.time() < self._window_watch_ignore_until:
-                        return True
+                    if parsed:
+                        self._window_watch_last_w, self._window_watch_last_h = parsed[0], parsed[1]
+                    # Still moving/resizing; write once it has settled.
+                    return True
 
-                    self.window_state_file.write_text(geometry)
-                    self.log(f"Window geometry saved: {geometry}")
+                self._flush_window_watch_geometry()
             except Exception as e:
                 # Best-effort; don't crash the pipeline for window tooling issues.
-                self.log(f"Window save error: {e}")
+                self.log("Window save error: %s", e)
 
             return True
 
         # Polling is acceptable here; window managers don't emit a reliable event
         # stream we can subscribe to in this script, and this avoids extra threads.
         self._window_watch_id = GLib.timeout_add_seconds(1, _tick)
-    
+
+    def _flush_window_watch_geometry(self) -> None:
+        """Write the geometry last seen by the window watch, if not yet saved."""
+        geometry = self._window_watch_last_geometry
+        if not geometry or geometry == self._window_watch_last_written:
+            return
+        # Do not write the transient initial geometry.
+        if time.time() < self._window_watch_ignore_until:
+            return
+        self._write_window_state(geometry)
+        self._window_watch_last_written = geometry
+        self.log("Window geometry saved: %s", geometry)
+
+    def _write_window_state(self, geometry: str) -> None:
+        """Atomically replace the window state file with `geometry`.
+
+        Writes a sibling temp file with raw os.open/os.write and renames it
+        over the state file, so readers never see a partial geometry.
+        """
+        final_path = str(self.window_state_file)
+        tmp_path = final_path + '.tmp'
+        fd = os.open(
+            tmp_path,
+            os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW | os.O_CLOEXEC,
+            0o644,
+        )
+        try:
+            os.write(fd, geometry.encode('ascii'))
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, final_path)
+
+    def _create_preview_window(self) -> bool:
+        """Create our own X11 window for the video sink to render into.
+
+        The window is sized and positioned from the saved state (or --width)
+        before it is mapped, and geometry changes arrive as configure events,
+        so none of the wmctrl/xwininfo restore and polling logic is needed.
+
+        Returns False if GTK or an X11 display is not available.
+        """
+        if not _load_gtk():
+            self.log("GTK not available, using sink-owned window")
+            return False
+
+        display = Gdk.Display.get_default()
+        if not isinstance(display, GdkX11.X11Display):
+            self.log("No X11 display for GTK, using sink-owned window")
+            return False
+
+        window = Gtk.Window(title="HDMI USB")
+        # The sink paints the whole window; keep GTK from drawing over it.
+        window.set_app_paintable(True)
+
+        # Let the window manager keep the window at 16:9 while resizing.
+        hints = Gdk.Geometry()
+        hints.min_aspect = 16 / 9
+        hints.max_aspect = 16 / 9
+        window.set_geometry_hints(None, hints, Gdk.WindowHints.ASPECT)
+
+        if self.force_width:
+            width = _round_even(max(int(self.force_width), 2))
+            height = _compute_height_for_16_9(width)
+            self.log("Forcing local window size: %sx%s (16:9)", width, height)
+            window.set_default_size(width, height)
+        elif self.restore_width is not None:
+            width = self.restore_width
+            height = self.restore_height
+            # Some window managers behave poorly with negative positions.
+            x = max(self.restore_x, 0)
+            y = max(self.restore_y, 0)
+            self.log("Creating window at saved geometry: %sx%s%+d%+d", width, height, x, y)
+            window.set_default_size(width, height)
+            window.move(x, y)
+            # Don't immediately re-save the geometry we just restored.
+            self._window_watch_last_geometry = f"{width}x{height}{x:+d}{y:+d}"
+        else:
+            width = LOCAL_WINDOW_DEFAULT_WIDTH
+            window.set_default_size(width, _compute_height_for_16_9(width))
+
+        window.connect("delete-event", self._on_window_delete)
+        window.connect("configure-event", self._on_window_configure)
+        window.show()
+
+        self._window = window
+        self._window_xid = window.get_window().get_xid()
+        self.log("Created preview window: %#x", self._window_xid)
+        return True
+
+    def _on_window_delete(self, *_args) -> bool:
+        """Handle the user closing the preview window."""
+        print("🔴 Local display window closed, shutting down gracefully...")
+        if self.server:
+            GLib.idle_add(self.server.shutdown)
+        else:
+            GLib.idle_add(self.stop)
+        # Keep the window alive until the pipeline has been stopped.
+        return True
+
+    def _on_window_configure(self, window, _event) -> bool:
+        """Record window geometry changes and save them once they settle."""
+        if self.force_width:
+            return False
+
+        width, height = window.get_size()
+        x, y = window.get_position()
+        self._window_pending_geometry = f"{width}x{height}{x:+d}{y:+d}"
+
+        # Configure events arrive in bursts while dragging/resizing; only
+        # write the state file once the window has been still for a moment.
+        if self._window_save_id is not None:
+            GLib.source_remove(self._window_save_id)
+        self._window_save_id = GLib.timeout_add(
+            WINDOW_STATE_SAVE_DELAY_MS, self._save_pending_window_state
+        )
+        return False
+
+    def _save_pending_window_state(self) -> bool:
+        """Write the last observed window geometry to the state file."""
+        self._window_save_id = None
+        geometry = self._window_pending_geometry
+        if not geometry or geometry == self._window_watch_last_geometry:
+            return False
+
+        try:
+            self._write_window_state(geometry)
+            self._window_watch_last_geometry = geometry
+            self.log("Window geometry saved: %s", geometry)
+        except Exception as e:
+            self.log("Window save error: %s", e)
+        return False
+
     def build_pipeline(self):
         """Build local display pipeline as RTSP client.
 
@@ -1371,12 +2136,15 @@ class LocalDisplayPipeline:
 
         # Prefer explicit sinks so window behavior is stable.
         #
-        # Also, build a small videosink bin that includes videoscale so the
-        # window can be resized freely. Without an explicit videoscale element,
-        # some setups end up effectively clamping the window width (you'll see
-        # height changes apply but width won't).
+        # Also, build a small videosink bin so the window can be resized
+        # freely. With ximagesink, which can't scale, an explicit videoscale
+        # element is needed; without it the window width ends up clamped
+        # (you'll see height changes apply but width won't).
+        # A one-frame leaky queue in front keeps the preview on the newest
+        # frame: if rendering stalls, stale frames are dropped before being
+        # converted and scaled instead of piling up behind the sink.
+        video_queue = Gst.ElementFactory.make("queue", "local_video_queue")
         videoconvert = Gst.ElementFactory.make("videoconvert", "local_videoconvert")
-        videoscale = Gst.ElementFactory.make("videoscale", "local_videoscale")
 
         # Prefer a sink that can scale to an arbitrarily-resized window without
         # requiring caps that force a specific width/height.
@@ -1388,17 +2156,29 @@ class LocalDisplayPipeline:
             Gst.ElementFactory.make("xvimagesink", "videosink") or
             Gst.ElementFactory.make("ximagesink", "videosink")
         )
-        if not (videoconvert and videoscale and videosink):
+        if not (video_queue and videoconvert and videosink):
             raise RuntimeError("Failed to create local video sink elements")
-        if self.debug_mode:
-            try:
-                factory = videosink.get_factory()
-                sink_name = factory.get_name() if factory else type(videosink).__name__
-                self.log(f"Using local videosink: {sink_name}")
-            except Exception:
-                pass
+        factory = videosink.get_factory()
+        sink_name = factory.get_name() if factory else type(videosink).__name__
+        self.log("Using local videosink: %s", sink_name)
+
+        # glimagesink and xvimagesink scale to the window on the GPU/Xv;
+        # only ximagesink needs a software videoscale in front of it.
+        chain = [video_queue, videoconvert]
+        if sink_name == "ximagesink":
+            videoscale = Gst.ElementFactory.make("videoscale", "local_videoscale")
+            if not videoscale:
+                raise RuntimeError("Failed to create local video sink elements")
+            chain.append(videoscale)
+        chain.append(videosink)
+
+        video_queue.set_property("max-size-buffers", 1)
+        video_queue.set_property("max-size-bytes", 0)
+        video_queue.set_property("max-size-time", 0)
+        Gst.util_set_object_arg(video_queue, "leaky", "downstream")
 
         videosink.set_property("sync", False)
+        videosink.set_property("qos", True)
         # Allow arbitrary resizing; don't enforce original aspect ratio in caps negotiation.
         try:
             videosink.set_property("force-aspect-ratio", False)
@@ -1406,16 +2186,16 @@ class LocalDisplayPipeline:
             pass
 
         video_bin = Gst.Bin.new("local_videosink_bin")
-        video_bin.add(videoconvert)
-        video_bin.add(videoscale)
-        video_bin.add(videosink)
-        if not Gst.Element.link(videoconvert, videoscale) or not Gst.Element.link(videoscale, videosink):
-            raise RuntimeError("Failed to link local video sink bin elements")
+        for element in chain:
+            video_bin.add(element)
+        for upstream, downstream in zip(chain, chain[1:]):
+            if not Gst.Element.link(upstream, downstream):
+                raise RuntimeError("Failed to link local video sink bin elements")
 
         # Expose a 'sink' pad on the bin so playbin can connect to it.
-        sink_pad = videoconvert.get_static_pad("sink")
+        sink_pad = video_queue.get_static_pad("sink")
         if not sink_pad:
-            raise RuntimeError("Failed to get videoconvert sink pad for ghosting")
+            raise RuntimeError("Failed to get queue sink pad for ghosting")
         ghost_pad = Gst.GhostPad.new("sink", sink_pad)
         video_bin.add_pad(ghost_pad)
 
@@ -1426,6 +2206,7 @@ class LocalDisplayPipeline:
 
         playbin.set_property("video-sink", video_bin)
         playbin.set_property("audio-sink", audiosink)
+        self._videosink = videosink
 
         return playbin
 
@@ -1435,8 +2216,7 @@ class LocalDisplayPipeline:
         self.restore_window_state()
         self._playing_init_done = False
         
-        if self.debug_mode:
-            print(f"[LOCAL] Building RTSP client pipeline for: {self.rtsp_url}")
+        self.log("Building RTSP client pipeline for: %s", self.rtsp_url)
 
         try:
             self.pipeline = self.build_pipeline()
@@ -1450,23 +2230,22 @@ class LocalDisplayPipeline:
                 bus.add_signal_watch()
                 bus.connect("message", self.on_bus_message)
 
+            # Render into our own window when possible (set before PLAYING so
+            # the sink never creates a window of its own).
+            if self._create_preview_window():
+                self._videosink.set_window_handle(self._window_xid)
+
             # Start playing
             ret = self.pipeline.set_state(Gst.State.PLAYING)
             if ret == Gst.StateChangeReturn.FAILURE:
                 print("❌ ERROR: Unable to set local display pipeline to PLAYING")
                 return False
             
-            # Wait for state change to complete or for ASYNC result
+            # Don't block on an ASYNC state change: the RTSP server answering
+            # this client runs on the same main loop. Reaching PLAYING (or an
+            # error) is reported on the bus.
             if ret == Gst.StateChangeReturn.ASYNC:
-                ret, state, pending = self.pipeline.get_state(3 * Gst.SECOND)
-                if ret == Gst.StateChangeReturn.FAILURE:
-                    print("❌ ERROR: Pipeline failed to reach PLAYING state")
-                    return False
-                elif ret == Gst.StateChangeReturn.ASYNC:
-                    print("⚠️  WARNING: Pipeline state change timed out, but continuing...")
-                    self.log("Pipeline may still be initializing in background")
-                else:
-                    self.log(f"Pipeline state change completed: {state.value_nick}")
+                self.log("Pipeline is prerolling; PLAYING will be reported on the bus")
             elif ret == Gst.StateChangeReturn.SUCCESS:
                 self.log("Pipeline started immediately")
 
@@ -1493,16 +2272,31 @@ class LocalDisplayPipeline:
                 if self._window_watch_id is not None:
                     GLib.source_remove(self._window_watch_id)
                     self._window_watch_id = None
+                    # Save a geometry change the watch hadn't written yet.
+                    self._flush_window_watch_geometry()
             except Exception:
                 pass
 
+            # Save any geometry change still waiting for its debounce timer.
+            if self._window_save_id is not None:
+                GLib.source_remove(self._window_save_id)
+                self._save_pending_window_state()
+
             if self.pipeline:
                 self.log("Stopping local display pipeline")
-                # Send EOS to gracefully stop the pipeline
+                # Take the bus off the main loop so EOS can be waited for here
+                bus = self.pipeline.get_bus()
+                if bus:
+                    bus.remove_signal_watch()
+
+                # Send EOS to gracefully stop the pipeline and wait (up to
+                # 0.5 s) for it to reach the sinks rather than sleeping blindly
                 self.pipeline.send_event(Gst.Event.new_eos())
-                
-                # Wait for EOS to be processed
-                time.sleep(0.5)
+                if bus:
+                    bus.timed_pop_filtered(
+                        500 * Gst.MSECOND,
+                        Gst.MessageType.EOS | Gst.MessageType.ERROR,
+                    )
                 
                 # Set pipeline to NULL state
                 self.pipeline.set_state(Gst.State.NULL)
@@ -1512,16 +2306,14 @@ class LocalDisplayPipeline:
                 if ret == Gst.StateChangeReturn.ASYNC:
                     self.log("Pipeline cleanup completed asynchronously")
                 
-                # Clean up bus
-                bus = self.pipeline.get_bus()
-                if bus:
-                    bus.remove_signal_watch()
-                
-                # Clear pipeline reference
+                # Clear pipeline reference. The preview is an RTSP client and
+                # never holds the capture device, so there is nothing to wait
+                # for after NULL.
                 self.pipeline = None
-                
-                # Give the device time to be released
-                time.sleep(0.5)
+
+            if self._window is not None:
+                self._window.destroy()
+                self._window = None
         except Exception as e:
             print(f"⚠️  Error during local display cleanup: {e}")
 
@@ -1538,6 +2330,9 @@ class RTSPServer(GstRtspServer.RTSPServer):
         video_device: Optional[str],
         audio_device_spec: Optional[str],
         use_mjpeg: bool,
+        video_encoder: str = "x264enc",
+        jpeg_decoder: str = "jpegdec",
+        audio_encoder: str = "voaacenc",
     ) -> str:
         """Build a gst-rtsp-server `set_launch()` pipeline string.
 
@@ -1552,11 +2347,19 @@ class RTSPServer(GstRtspServer.RTSPServer):
             # Quote device spec because it may contain commas (e.g. dsnoop:CARD=1,DEV=0).
             device_spec_q = device_spec.replace('"', '\\"')
             return (
-                f'alsasrc device="{device_spec_q}" ! '
-                f'queue max-size-time=1000000000 ! '
+                # ~40 ms ALSA ring buffer in 10 ms periods instead of the ~200 ms
+                # default; the pipeline clock comes from the system, not ALSA.
+                f'alsasrc device="{device_spec_q}" buffer-time=40000 latency-time=10000 '
+                f'provide-clock=false ! '
+                # Most HDMI capture audio is already 48 kHz stereo S16LE, in
+                # which case these pass buffers through untouched; dsnoop does
+                # no conversion, so they are needed for cards that differ.
                 f'audioconvert ! audioresample ! '
                 f'audio/x-raw,format=S16LE,rate={AUDIO_SAMPLE_RATE_HZ},channels=2 ! '
-                f'voaacenc bitrate={AUDIO_BITRATE_BPS} ! '
+                # Non-leaky: a brief encoder/pipeline stall must not drop
+                # audio (audible gaps); latency is bounded by the ALSA buffer.
+                f'queue ! '
+                f'{audio_encoder} bitrate={AUDIO_BITRATE_BPS} ! '
                 f'rtpmp4gpay pt=97 name={payload_name}'
             )
 
@@ -1564,18 +2367,63 @@ class RTSPServer(GstRtspServer.RTSPServer):
             if not video_device:
                 raise RuntimeError("No video device specified for RTSP launch")
 
-            source = f'v4l2src device={video_device} ! '
-            decoder = 'image/jpeg ! jpegdec ! ' if use_mjpeg else 'queue ! decodebin ! '
-            encoder = (
-                f'videoconvert ! video/x-raw,format=I420 ! '
-                f'x264enc tune=zerolatency key-int-max={VIDEO_KEYFRAME_INTERVAL_FRAMES} '
-                f'bitrate={VIDEO_BITRATE_KBPS} speed-preset=veryfast '
-                f'byte-stream=true threads=1 ! '
-                f'h264parse config-interval=1 ! '
-                f'video/x-h264,stream-format=avc,alignment=au ! '
-                f'rtph264pay config-interval=1 pt=96 name=pay0'
+            # With the V4L2 M2M MJPEG decoder, hand capture buffers over as
+            # DMA-BUFs so frames never pass through a CPU copy.
+            zero_copy = use_mjpeg and jpeg_decoder == "v4l2jpegdec"
+            if zero_copy:
+                source = f'v4l2src device={video_device} io-mode=dmabuf ! '
+            else:
+                source = f'v4l2src device={video_device} ! '
+
+            if not use_mjpeg:
+                decoder = 'queue ! decodebin ! '
+            elif jpeg_decoder == "v4l2jpegdec":
+                decoder = 'image/jpeg ! v4l2jpegdec capture-io-mode=dmabuf ! '
+            else:
+                decoder = f'image/jpeg ! {jpeg_decoder} ! '
+
+            if video_encoder == "vaapih264enc":
+                encoder = (
+                    f'vaapipostproc ! '
+                    f'vaapih264enc rate-control=cbr bitrate={VIDEO_BITRATE_KBPS} '
+                    f'keyframe-period={VIDEO_KEYFRAME_INTERVAL_FRAMES} ! '
+                )
+            elif video_encoder == "nvh264enc":
+                encoder = (
+                    f'videoconvert ! '
+                    f'nvh264enc preset=low-latency-hq rc-mode=cbr '
+                    f'bitrate={VIDEO_BITRATE_KBPS} '
+                    f'gop-size={VIDEO_KEYFRAME_INTERVAL_FRAMES} ! '
+                )
+            elif video_encoder == "v4l2h264enc":
+                # M2M decoder -> M2M encoder: let them negotiate a shared
+                # format instead of forcing a CPU conversion to I420.
+                convert = '' if zero_copy else 'videoconvert ! video/x-raw,format=I420 ! '
+                encoder = (
+                    f'{convert}'
+                    f'v4l2h264enc extra-controls="controls,'
+                    f'video_bitrate={VIDEO_BITRATE_KBPS * 1000},'
+                    f'h264_i_frame_period={VIDEO_KEYFRAME_INTERVAL_FRAMES}" ! '
+                    f'video/x-h264,level=(string)4 ! '
+                )
+            else:
+                encoder = (
+                    f'videoconvert ! video/x-raw,format=I420 ! '
+                    f'x264enc tune=zerolatency key-int-max={VIDEO_KEYFRAME_INTERVAL_FRAMES} '
+                    f'bitrate={VIDEO_BITRATE_KBPS} speed-preset=veryfast '
+                    f'byte-stream=true ! '
+                )
+            # Drop stale frames here, before any conversion or encode work,
+            # when the encoder falls behind; also splits decode and encode
+            # into separate streaming threads.
+            encode_queue = 'queue leaky=downstream max-size-buffers=2 max-size-time=0 max-size-bytes=0 ! '
+            payloader = (
+                'h264parse config-interval=-1 ! '
+                'video/x-h264,stream-format=avc,alignment=au ! '
+                'rtph264pay config-interval=-1 aggregate-mode=zero-latency '
+                'mtu=1400 pt=96 name=pay0'
             )
-            return source + decoder + encoder
+            return source + decoder + encode_queue + encoder + payloader
 
         video_pipeline = _build_video()
         if audio_device_spec:
@@ -1591,6 +2439,7 @@ class RTSPServer(GstRtspServer.RTSPServer):
 
         if not element:
             return
+        self._medias.append(media)
 
         try:
             bus = element.get_bus()
@@ -1600,45 +2449,80 @@ class RTSPServer(GstRtspServer.RTSPServer):
         if not bus:
             return
 
+        # Only ERROR (and WARNING in debug mode) are of interest. Detailed
+        # sync-message signals keep every other message out of Python, and
+        # rtsp-media's own bus watch still sees the full stream.
         try:
-            bus.add_signal_watch()
-            bus.connect("message", self._on_media_bus_message)
+            bus.enable_sync_message_emission()
+            bus.connect("sync-message::error", self._on_media_sync_message)
+            if self.debug_mode:
+                bus.connect("sync-message::warning", self._on_media_sync_message)
+            if self.realtime:
+                bus.connect("sync-message::stream-status", self._on_stream_status)
         except Exception:
             # Best-effort; don't crash server for monitoring issues.
             return
 
+    def _on_stream_status(self, _bus, message) -> None:
+        """Give capture streaming threads real-time scheduling (--realtime).
+
+        ENTER is posted synchronously from the new streaming thread itself,
+        so the scheduling change applies to exactly that thread. Encoder and
+        main-loop threads keep normal priority.
+        """
+        status_type, owner = message.parse_stream_status()
+        if status_type != Gst.StreamStatusType.ENTER:
+            return
+        factory = owner.get_factory() if owner else None
+        if not factory or factory.get_name() not in REALTIME_ELEMENTS:
+            return
+        try:
+            apply_realtime_scheduling()
+            logger.debug("[INFO] %s streaming thread: SCHED_RR %d, off CPU 0",
+                         factory.get_name(), REALTIME_PRIORITY)
+        except OSError as e:
+            if not self._realtime_warned:
+                self._realtime_warned = True
+                print(f"[{timestamp()}] ⚠️  --realtime: could not set real-time "
+                      f"scheduling ({e}), using normal priority")
+
+    def _on_media_sync_message(self, bus, message) -> None:
+        """Hand a message from a streaming thread over to the main loop."""
+        GLib.idle_add(self._on_media_bus_message, bus, message)
+
     def _on_media_bus_message(self, _bus, message) -> bool:
-        """Monitor bus messages for errors and warnings."""
+        """Monitor bus messages for errors and warnings (one-shot idle callback)."""
         msg_type = message.type
 
         if msg_type == Gst.MessageType.ERROR:
             err, debug_info = message.parse_error()
             error_msg = err.message
-            print(f"❌ GStreamer Pipeline ERROR: {error_msg}")
-            if self.debug_mode:
-                print(f"   Debug: {debug_info}")
+            logger.debug("   Debug: %s", debug_info)
 
-            # Report critical errors to server
-            critical_keywords = ("resource busy", "failed to", "cannot")
-            if any(kw in error_msg.lower() for kw in critical_keywords):
+            # Critical errors are reported (and printed) by the server;
+            # only print the rest here.
+            if _CRITICAL_ERROR_RE.search(error_msg):
                 self.on_pipeline_error(error_msg)
+            else:
+                print(f"❌ GStreamer Pipeline ERROR: {error_msg}")
 
         elif msg_type == Gst.MessageType.WARNING and self.debug_mode:
             warn, _ = message.parse_warning()
-            print(f"⚠️  Pipeline WARNING: {warn.message}")
+            logger.debug("⚠️  Pipeline WARNING: %s", warn.message)
 
-        return True
+        return False
 
     def test_audio_device_spec_availability(self, device_spec: str) -> bool:
         """Test if an ALSA capture device is available for RTSP streaming."""
-        try:
-            result = subprocess.run(
-                ['arecord', '-D', device_spec, '-f', 'cd', '-d', '1', '/dev/null'],
-                capture_output=True, text=True, timeout=3
-            )
-            return result.returncode == 0
-        except (subprocess.TimeoutExpired, subprocess.CalledProcessError, FileNotFoundError):
-            return False
+        available = alsa_capture_available(device_spec)
+        if available is not None:
+            return available
+
+        # libasound isn't loadable from Python; fall back to a short recording.
+        return run_quiet(
+            ['arecord', '-D', device_spec, '-f', 'cd', '-d', '1', '/dev/null'],
+            timeout=3,
+        ) == 0
 
     def _pick_audio_device_spec(self, audio_card: str) -> Optional[str]:
         """Pick a good ALSA device string for capture.
@@ -1656,8 +2540,50 @@ class RTSPServer(GstRtspServer.RTSPServer):
                 return spec
         return None
 
-    def __init__(self, debug_mode=False, headless=False, viewer_width: Optional[int] = None):
+    def _detect_audio(self, detector: "HDMIDeviceDetector", video_device: str):
+        """Find the audio card for `video_device` and a usable capture spec.
+
+        Returns `(audio_card, device_spec)`; either may be None.
+        """
+        audio_card = detector.detect_audio_card(video_device)
+        if not audio_card:
+            return None, None
+        # Pick a capture device spec and verify availability.
+        return audio_card, self._pick_audio_device_spec(audio_card)
+
+    def _pick_video_encoder(self) -> str:
+        """Pick the H.264 encoder element for the RTSP pipeline.
+
+        Prefer a hardware encoder (VAAPI, NVENC, V4L2 M2M) that can actually
+        be opened on this machine; fall back to software x264enc.
+        """
+        for name in HW_H264_ENCODERS:
+            if element_usable(name):
+                return name
+            logger.debug("[INFO] Hardware encoder %s not usable", name)
+        return "x264enc"
+
+    def _pick_jpeg_decoder(self) -> str:
+        """Pick the MJPEG decoder element, preferring a usable hardware one."""
+        for name in HW_JPEG_DECODERS:
+            if element_usable(name):
+                return name
+            logger.debug("[INFO] Hardware JPEG decoder %s not usable", name)
+        return "jpegdec"
+
+    def _pick_audio_encoder(self) -> str:
+        """Pick the AAC encoder element, preferring fdkaacenc over voaacenc."""
+        for name in AAC_ENCODERS:
+            if Gst.ElementFactory.find(name):
+                return name
+            logger.debug("[INFO] AAC encoder %s not available", name)
+        return "voaacenc"
+
+    def __init__(self, debug_mode=False, headless=False, viewer_width: Optional[int] = None,
+                 realtime: bool = False):
         super().__init__()
+        self.realtime = realtime
+        self._realtime_warned = False
         self.port = DEFAULT_RTSP_PORT
         self.endpoint = DEFAULT_RTSP_ENDPOINT
         self.debug_mode = debug_mode
@@ -1667,6 +2593,12 @@ class RTSPServer(GstRtspServer.RTSPServer):
         self.local_display = None
         self.viewer_width = viewer_width
         self.audio_device_spec: Optional[str] = None
+        # Media created by the factory, and whether shutdown() unprepared them
+        # all (i.e. brought their pipelines to NULL, releasing the capture
+        # devices).
+        self._medias = []
+        self.media_released = False
+        self.video_device: Optional[str] = None
         self.set_address("0.0.0.0")
         self.set_service(self.port)
         
@@ -1682,21 +2614,33 @@ class RTSPServer(GstRtspServer.RTSPServer):
             raise RuntimeError(
                 "Could not find a MacroSilicon USB Video HDMI capture device"
             )
-
-        if video_device:
-            audio_card = detector.detect_audio_card(video_device)
-            print(f"[{timestamp()}] ✅ Found video device: {video_device}")
-            if audio_card:
-                print(f"[{timestamp()}] ✅ Found audio card: {audio_card}")
-                # Pick a capture device spec and verify availability.
-                self.audio_device_spec = self._pick_audio_device_spec(audio_card)
-                if not self.audio_device_spec:
-                    print(f"[{timestamp()}] ⚠️  Audio device busy - using video-only mode")
-                    audio_card = None
-                else:
-                    print(f"[{timestamp()}] ✅ Audio device available for streaming ({self.audio_device_spec})")
+        self.video_device = video_device
+
+        # The remaining probes only depend on the video device. They are now
+        # ioctls and a libasound open rather than subprocesses, but each still
+        # waits on a driver (USB control transfers for uvcvideo, snd_pcm_open
+        # on the USB audio card; arecord/v4l2-ctl when falling back), as do
+        # the encoder probes that bring VA/NVENC elements to READY here. All
+        # of these release the GIL, so overlapping them shortens startup.
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            audio_future = executor.submit(self._detect_audio, detector, video_device)
+            mjpeg_future = executor.submit(detector.check_mjpeg_support, video_device)
+            video_encoder = self._pick_video_encoder()
+            jpeg_decoder = self._pick_jpeg_decoder()
+            audio_card, audio_spec = audio_future.result()
+            use_mjpeg = mjpeg_future.result()
+
+        print(f"[{timestamp()}] ✅ Found video device: {video_device}")
+        if audio_card:
+            print(f"[{timestamp()}] ✅ Found audio card: {audio_card}")
+            self.audio_device_spec = audio_spec
+            if not self.audio_device_spec:
+                print(f"[{timestamp()}] ⚠️  Audio device busy - using video-only mode")
+                audio_card = None
             else:
-                print(f"[{timestamp()}] ⚠️  No audio device found - video only")
+                print(f"[{timestamp()}] ✅ Audio device available for streaming ({self.audio_device_spec})")
+        else:
+            print(f"[{timestamp()}] ⚠️  No audio device found - video only")
 
         # Determine if we need local display (as RTSP client)
         use_local_display = not self.headless and video_device
@@ -1710,24 +2654,21 @@ class RTSPServer(GstRtspServer.RTSPServer):
         if hasattr(self.factory, "set_reusable"):
             self.factory.set_reusable(True)
 
-        use_mjpeg = False
-        if video_device:
-            try:
-                # Check if the video device supports MJPEG format.
-                result = subprocess.run(
-                    ['v4l2-ctl', '-d', video_device, '--list-formats-ext'],
-                    capture_output=True,
-                    text=True,
-                    timeout=SUBPROCESS_TIMEOUT_SECONDS,
-                )
-                use_mjpeg = ('MJPG' in result.stdout) or ('MJPEG' in result.stdout)
-            except Exception:
-                use_mjpeg = True
+        print(f"[{timestamp()}] ✅ Video encoder: {video_encoder}")
+        if use_mjpeg:
+            print(f"[{timestamp()}] ✅ MJPEG decoder: {jpeg_decoder}")
+        audio_encoder = "voaacenc"
+        if audio_card:
+            audio_encoder = self._pick_audio_encoder()
+            print(f"[{timestamp()}] ✅ Audio encoder: {audio_encoder}")
 
         launch = self._build_rtsp_launch_string(
             video_device=video_device,
             audio_device_spec=self.audio_device_spec if audio_card else None,
             use_mjpeg=use_mjpeg,
+            video_encoder=video_encoder,
+            jpeg_decoder=jpeg_decoder,
+            audio_encoder=audio_encoder,
         )
         self.factory.set_launch(launch)
         self.factory.connect("media-configure", self._on_media_configure)
@@ -1759,23 +2700,26 @@ class RTSPServer(GstRtspServer.RTSPServer):
         if self.headless:
             print(f"[{timestamp()}] 🚫 Headless mode: local display disabled")
         
-        # Start local display as RTSP client after server is ready
+        # Start local display as RTSP client once the main loop is running.
+        # The socket is already bound by attach(), but requests are only
+        # served from the main loop, so waiting here would just delay both.
         if use_local_display:
-            # Wait longer for server to be fully ready and accept connections
-            # The server needs time to bind to the port and be ready
-            print(f"[{timestamp()}] 🖥️  Waiting for RTSP server to be ready...")
-            time.sleep(3)  # Increased wait time for server to be fully ready
-            print(f"[{timestamp()}] 🖥️  Starting local display as RTSP client...")
-            self.local_display = LocalDisplayPipeline(
-                rtsp_url=rtsp_url,
-                debug_mode=debug_mode,
-                server=self,  # Pass server reference for shutdown callback
-                force_width=self.viewer_width,
-            )
-            if not self.local_display.start():
-                print(f"[{timestamp()}] ⚠️  Local display failed to start, "
-                      f"continuing with RTSP server only")
-                self.local_display = None
+            GLib.idle_add(self._start_local_display, rtsp_url)
+
+    def _start_local_display(self, rtsp_url: str) -> bool:
+        """Connect the local preview to the server (one-shot idle callback)."""
+        print(f"[{timestamp()}] 🖥️  Starting local display as RTSP client...")
+        self.local_display = LocalDisplayPipeline(
+            rtsp_url=rtsp_url,
+            debug_mode=self.debug_mode,
+            server=self,  # Pass server reference for shutdown callback
+            force_width=self.viewer_width,
+        )
+        if not self.local_display.start():
+            print(f"[{timestamp()}] ⚠️  Local display failed to start, "
+                  f"continuing with RTSP server only")
+            self.local_display = None
+        return False
 
     def on_client_connected(self, server, client):
         """Handle client connection."""
@@ -1795,8 +2739,9 @@ class RTSPServer(GstRtspServer.RTSPServer):
         print(f"[{timestamp()}] 💥 Critical pipeline failure - "
               f"shutting down server")
 
+        # Called from the main loop (bus messages are handed over via idle_add).
         if self.main_loop:
-            GLib.idle_add(self.main_loop.quit)
+            self.main_loop.quit()
 
     def set_main_loop(self, loop):
         """Set the main loop reference for error handling."""
@@ -1815,6 +2760,16 @@ class RTSPServer(GstRtspServer.RTSPServer):
                 print(f"[{timestamp()}] 🖥️  Stopping local display...")
                 self.local_display.stop()
                 self.local_display = None
+
+            # Stop the capture pipelines so v4l2src/alsasrc close their devices
+            # before we report a clean exit. get_element() is only the bin
+            # inside the media's pipeline; unprepare() takes the whole
+            # pipeline to NULL and keeps rtsp-media's own state consistent.
+            released = True
+            for media in self._medias:
+                released = media.unprepare() and released
+            self._medias.clear()
+            self.media_released = released
             
             # Quit the main loop to exit gracefully
             if self.main_loop:
@@ -1827,12 +2782,32 @@ class RTSPServer(GstRtspServer.RTSPServer):
 # Main Application Entry Point
 # =============================================================================
 
-def main():
-    """Main entry point for the unified RTSP server."""
-    parser = argparse.ArgumentParser(
-        description='Unified HDMI USB Capture RTSP Server',
-        formatter_class=argparse.RawDescriptionHelpFormatter,
-        epilog='''
+def _install_signal_handlers(server: "RTSPServer", loop) -> None:
+    """Shut the server down and quit `loop` on SIGINT/SIGTERM.
+
+    When the app is blocked in GLib.MainLoop().run(), Python-level signal
+    handlers (signal.signal) may not fire promptly because the interpreter
+    isn't regularly regaining control, so the signals are integrated with
+    GLib instead. The handler only holds a weak reference to the server.
+    """
+    server_ref = weakref.ref(server)
+
+    def _glib_shutdown_handler(*_args) -> bool:
+        print(f"\n[{timestamp()}] 👋 Shutting down RTSP server gracefully...")
+        try:
+            server = server_ref()
+            if server is not None:
+                server.shutdown()
+        finally:
+            loop.quit()
+        return False  # GLib.SOURCE_REMOVE
+
+    # High priority so shutdown isn't queued behind pending idle work.
+    GLib.unix_signal_add(GLib.PRIORITY_HIGH, signal.SIGINT, _glib_shutdown_handler)
+    GLib.unix_signal_add(GLib.PRIORITY_HIGH, signal.SIGTERM, _glib_shutdown_handler)
+
+
+_EPILOG = '''
 DESCRIPTION:
     Automatically detects MacroSilicon USB Video HDMI capture devices and
     streams live video/audio over RTSP. The server will auto-detect both
@@ -1845,9 +2820,10 @@ DESCRIPTION:
     
     By default, displays a local preview window showing the captured audio
     and video. The window position and size are automatically saved and
-    restored between sessions. The video source is shared between the local
-    display and RTSP clients using intervideosink/src. Use --headless to
-    disable the local display (RTSP server will access the device directly).
+    restored between sessions. The local display is itself an RTSP client of
+    the same shared server pipeline, so the device is captured and encoded
+    once no matter how many clients connect. Use --headless to disable the
+    local display.
 
     Default RTSP URL: rtsp://0.0.0.0:1234/hdmi
 
@@ -1856,6 +2832,7 @@ EXAMPLES:
     %(prog)s --headless          # Stream without local display window
     %(prog)s --debug             # Enable debug output
     %(prog)s --reset-window      # Reset saved window position
+    %(prog)s --realtime          # Real-time capture threads, off CPU 0
     AUDIO_FORCE_CARD=1 %(prog)s  # Force specific audio card
 
     # Connect with ffplay (recommended)
@@ -1871,7 +2848,15 @@ COMPATIBILITY:
     ✅ Works with: ffplay, GStreamer, most RTSP clients
     ⚠️  Known issues: VLC may have compatibility issues with RTSP SETUP requests
                      (use ffplay or other RTSP clients instead)
-    '''
+'''
+
+
+def main():
+    """Main entry point for the unified RTSP server."""
+    parser = argparse.ArgumentParser(
+        description='Unified HDMI USB Capture RTSP Server',
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog=_EPILOG,
     )
     parser.add_argument(
         '--headless',
@@ -1899,7 +2884,18 @@ COMPATIBILITY:
         action='store_true',
         help='Enable GStreamer debug output (very verbose)'
     )
+    parser.add_argument(
+        '--realtime',
+        action='store_true',
+        help='Run capture threads off CPU 0 with SCHED_RR priority (needs CAP_SYS_NICE)'
+    )
     args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.debug else logging.WARNING,
+        format="%(message)s",
+        stream=sys.stdout,
+    )
     
     # Handle reset-window option
     if args.reset_window:
@@ -1918,53 +2914,21 @@ COMPATIBILITY:
     server = None
     try:
         if args.headless:
-            print("\033[92m🎥🎵 Starting RTSP server in HEADLESS mode "
-                  "(no local display)\033[0m")
+            print(f"{_GREEN}🎥🎵 Starting RTSP server in HEADLESS mode "
+                  f"(no local display){_RESET}")
         else:
-            print("\033[92m🎥🎵 Starting unified RTSP server with local display "
-                  "and HDMI capture\033[0m")
+            print(f"{_GREEN}🎥🎵 Starting unified RTSP server with local display "
+                  f"and HDMI capture{_RESET}")
 
         server = RTSPServer(
             debug_mode=args.debug,
             headless=args.headless,
             viewer_width=args.width,
+            realtime=args.realtime,
         )
         loop = GLib.MainLoop()
         server.set_main_loop(loop)
-
-        def _shutdown_and_quit() -> None:
-            print(f"\n[{timestamp()}] 👋 Shutting down RTSP server gracefully...")
-            try:
-                server.shutdown()
-            finally:
-                loop.quit()
-
-        # When the app is blocked in GLib.MainLoop().run(), Python-level signal
-        # handlers (signal.signal) may not fire promptly because the interpreter
-        # isn't regularly regaining control.
-        #
-        # Integrate SIGINT/SIGTERM with GLib so background runs stop cleanly.
-        def _glib_shutdown_handler(*_args) -> bool:
-            _shutdown_and_quit()
-            return False  # GLib.SOURCE_REMOVE
-
-        installed_glib_handlers = False
-        try:
-            unix_signal_add = getattr(GLib, "unix_signal_add", None)
-            if unix_signal_add is not None:
-                unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGINT, _glib_shutdown_handler)
-                unix_signal_add(GLib.PRIORITY_DEFAULT, signal.SIGTERM, _glib_shutdown_handler)
-                installed_glib_handlers = True
-        except Exception:
-            installed_glib_handlers = False
-
-        if not installed_glib_handlers:
-            # Fallback: best-effort Python signal handlers.
-            def shutdown_handler(sig, frame):
-                _shutdown_and_quit()
-
-            signal.signal(signal.SIGINT, shutdown_handler)
-            signal.signal(signal.SIGTERM, shutdown_handler)
+        _install_signal_handlers(server, loop)
 
         print(f"[{timestamp()}] 🎬 HDMI capture RTSP server ready for "
               f"connections")
@@ -1978,6 +2942,8 @@ COMPATIBILITY:
             print(f"\n❌ Server terminated due to {server.pipeline_errors} "
                   f"pipeline error(s)")
             exit(1)
+        if server.media_released:
+            mark_clean_exit(server.video_device)
 
     except RuntimeError as e:
         print(f"❌ ERROR: {e}")